@@ -0,0 +1,553 @@
+#!/opt/libreoffice5.2/program/python
+# -*- coding: utf-8 -*-
+# configexamples.pyの各機能のベンチマーク。sofficeの代わりに遅延を模したプロセス内の偽ブリッジを使う。
+import sys
+import time
+import tracemalloc
+import threading
+import json
+import os
+import tempfile
+import asyncio
+import timeit
+import copy
+import weakref
+import io
+from contextlib import redirect_stdout
+from functools import partial
+from collections import namedtuple, OrderedDict
+from configexamples import Proxy, createSnapshotReader, createConfigReader, createConfigUpdater, ConfigCache, Evaluator, walkNodes, formatValue, exportConfigurations, exportSnapshot, SnapshotFile, writeSnapshot, ConfigBatch, ChangesDispatcher, GRID_OPTIONS, OfficeSession, readGridSnapshot, createProvider, buildHashTree, diffTrees, flattenDict, BridgeTracer, readGridConfiguration, printRegisteredFilters, editGridOptions, splitPath, segmentName, escapeSegment
+
+
+class FakeBridge:  # ブリッジ越しの呼び出しを数えて遅延を模すクラス。
+    def __init__(self, latency=0.001):
+        self.latency = latency  # 1回の呼び出しにかかる秒数。
+        self.calls = 0  # 呼び出しの総数。
+        self._lock = threading.Lock()  # 複数のスレッドから呼ばれる。
+    def roundtrip(self):  # 偽ノードのメソッドから呼ばれる。
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+ChangesEvent = namedtuple("ChangesEvent", "Source Base Changes")  # com.sun.star.util.ChangesEventの代わり。
+ElementChange = namedtuple("ElementChange", "Accessor Element ReplacedElement")  # com.sun.star.util.ElementChangeの代わり。
+class pyuno:  # PyUNOオブジェクトの代わりの偽グループノード。type(node).__name__=="pyuno"で判定されるのでこのクラス名にしている。
+    def __init__(self, provider, path, data, access=None, template=""):
+        self._provider = provider
+        self._path = path  # 絶対パス。セット要素名はエスケープしてある。
+        self._data = data  # 子ノード名をキーにした辞書。
+        self._access = self if access is None else access  # createInstanceWithArguments()で作成した根ノード。
+        self._template = template  # セット要素のときのテンプレート名。
+        self._pending = OrderedDict()  # 根ノードのときcommitChanges()していない変更。キー: 絶対パス。
+    def _resolve(self, names):  # 子孫の値を返す。ノードのときは偽ノードにする。namesはエスケープを除いた名前のリスト。
+        data, path = self._data, self._path
+        for name in names:
+            if not isinstance(data, dict) or name not in data:
+                raise KeyError(name)  # com.sun.star.container.NoSuchElementExceptionの代わり。
+            path = "{}/{}".format(path, escapeSegment(getattr(data, "template", ""), name))  # _childPath()と同じ。
+            parent, data = data, data[name]
+        if path in self._provider.delays:  # 遅いパスを模す。
+            time.sleep(self._provider.delays[path])
+        if isinstance(data, dict):
+            return createNode(self._provider, path, data, parent, self._access)
+        return self._access._pending.get(path, data)  # 未確定の変更はそのアクセスからは見える。
+    def getElementNames(self):
+        self._provider.bridge.roundtrip()
+        return tuple(self._data)
+    def hasByName(self, name):
+        self._provider.bridge.roundtrip()
+        return name in self._data
+    def getByName(self, name):  # セット要素名は"/"を含みうるので分けない。
+        self._provider.bridge.roundtrip()
+        return self._resolve([name])
+    getPropertyValue = getByName
+    def getByHierarchicalName(self, name):
+        self._provider.bridge.roundtrip()
+        return self._resolve([segmentName(i) for i in splitPath(name)])
+    getHierarchicalPropertyValue = getByHierarchicalName
+    def getPropertyValues(self, names):
+        self._provider.bridge.roundtrip()
+        return tuple(self._resolve([name]) for name in names)
+    def getHierarchicalPropertyValues(self, names):
+        self._provider.bridge.roundtrip()
+        return tuple(self._resolve([segmentName(i) for i in splitPath(name)]) for name in names)
+    def getName(self):
+        self._provider.bridge.roundtrip()
+        return segmentName(splitPath(self._path)[-1])
+    def getHierarchicalName(self):
+        self._provider.bridge.roundtrip()
+        return self._path
+    def composeHierarchicalName(self, name):
+        self._provider.bridge.roundtrip()
+        return self._childPath(name)
+    def _childPath(self, name):  # configmgrと同じくセット要素名はエスケープする。
+        return "{}/{}".format(self._path, escapeSegment(getattr(self._data, "template", ""), name))
+    def _set(self, names, value):
+        if not self._provider.writable(self._access):
+            raise PermissionError("/".join(names))  # com.sun.star.lang.IllegalArgumentExceptionの代わり。
+        node = self._resolve(names[:-1]) if len(names)>1 else self
+        node._resolve(names[-1:])  # 存在しないときは例外。
+        self._access._pending[node._childPath(names[-1])] = value
+    def replaceByName(self, name, value):
+        self._provider.bridge.roundtrip()
+        self._set([name], value)
+    setPropertyValue = replaceByName
+    def replaceByHierarchicalName(self, name, value):
+        self._provider.bridge.roundtrip()
+        self._set([segmentName(i) for i in splitPath(name)], value)
+    setHierarchicalPropertyValue = replaceByHierarchicalName
+    def setPropertyValues(self, names, values):
+        self._provider.bridge.roundtrip()
+        for name, value in zip(names, values):
+            self._set([name], value)
+    def setHierarchicalPropertyValues(self, names, values):
+        self._provider.bridge.roundtrip()
+        for name, value in zip(names, values):
+            self._set([segmentName(i) for i in splitPath(name)], value)
+    def commitChanges(self):
+        self._provider.bridge.roundtrip()
+        pending, self._access._pending = self._access._pending, OrderedDict()
+        self._provider.commit(self, pending)
+    def addChangesListener(self, listener):
+        self._provider.bridge.roundtrip()
+        self._provider.listeners.append((self, listener))
+    def removeChangesListener(self, listener):
+        self._provider.bridge.roundtrip()
+        self._provider.listeners.remove((self, listener))
+    def dispose(self):
+        self._provider.bridge.roundtrip()
+        for node, listener in [i for i in self._provider.listeners if i[0] is self]:  # 破棄したノードのリスナーに通知する。
+            self._provider.listeners.remove((node, listener))
+            listener.disposing(None)
+class FakeSetNode(pyuno):  # 偽セットノード。XMultiPropertySetなどのプロパティのメソッドはない。
+    def __getattribute__(self, name):
+        if name in SET_MISSING:
+            raise AttributeError(name)
+        return super().__getattribute__(name)
+    def getElementTemplateName(self):
+        self._provider.bridge.roundtrip()
+        return self._data.template
+SET_MISSING = frozenset(("getPropertyValue", "getPropertyValues", "getHierarchicalPropertyValue", "getHierarchicalPropertyValues",
+                         "setPropertyValue", "setPropertyValues", "setHierarchicalPropertyValue", "setHierarchicalPropertyValues"))
+class FakeSetElement(pyuno):  # 偽セット要素。XTemplateInstanceのメソッドがある。
+    def getTemplateName(self):
+        self._provider.bridge.roundtrip()
+        return self._template
+FakeSetNode.__name__ = FakeSetElement.__name__ = "pyuno"  # isPyUNO()に判定させる。
+class SetData(dict):  # セットノードの辞書。templateは要素のテンプレート名。
+    def __init__(self, template, *args):
+        super().__init__(*args)
+        self.template = template
+def createNode(provider, path, data, parent=None, access=None):  # 辞書の種類に合った偽ノードを返す。
+    if isinstance(data, SetData):
+        return FakeSetNode(provider, path, data, access)
+    if isinstance(parent, SetData):
+        return FakeSetElement(provider, path, data, access, parent.template)
+    return pyuno(provider, path, data, access)
+class FakeProvider:  # ConfigurationProviderの代わり。入れ子の辞書を設定の木にする。
+    def __init__(self, tree, latency=0.001):
+        self.tree = tree
+        self.bridge = FakeBridge(latency)
+        self.listeners = []  # (ノード, XChangesListener)のタプルのリスト。
+        self.updaters = set()  # ConfigurationUpdateAccessで作成した根ノードのid。
+        self.fail = set()  # commitChanges()で例外を起こす根ノードのパス。
+        self.delays = {}  # キー: 絶対パス、値: 取得するときに追加でかかる秒数。
+    def createInstanceWithArguments(self, service, args):
+        self.bridge.roundtrip()
+        path = [i.Value for i in args if i.Name=="nodepath"][0].rstrip("/")
+        data = parent = self.tree
+        for segment in splitPath(path):
+            parent, data = data, data[segmentName(segment)]
+        node = createNode(self, path, data, parent)
+        if service=="com.sun.star.configuration.ConfigurationUpdateAccess":
+            self.updaters.add(id(node))
+        return node
+    def writable(self, access):
+        return id(access) in self.updaters
+    def commit(self, source, pending):  # 変更を木に書き込んでリスナーに通知する。
+        if source._access._path in self.fail:
+            raise RuntimeError("commit failed: {}".format(source._access._path))  # com.sun.star.lang.WrappedTargetExceptionの代わり。
+        changes = []
+        for path, value in pending.items():
+            *parents, name = [segmentName(i) for i in splitPath(path)]
+            data = self.tree
+            for segment in parents:
+                data = data[segment]
+            changes.append((path, value, data[name]))
+            data[name] = value
+        for node, listener in list(self.listeners):  # リスナーを付けたノード以下の変更だけを通知する。
+            prefix = node._path + "/"
+            elements = tuple(ElementChange(path[len(prefix):], value, old) for path, value, old in changes if path.startswith(prefix))
+            if elements:
+                listener.changesOccurred(ChangesEvent(source, node, elements))
+
+
+def createGridTree():  # /org.openoffice.Office.Calc/Gridを模した木を返す。
+    return {"org.openoffice.Office.Calc": {"Grid": {
+        "Option": {"VisibleGrid": True, "SnapToGrid": False, "Synchronize": True, "SizeToGrid": False},
+        "Resolution": {"XAxis": {"Metric": 1000, "NonMetric": 1270}, "YAxis": {"Metric": 1000, "NonMetric": 1270}},
+        "Subdivision": {"XAxis": 1, "YAxis": 1}}}}
+def createFilterTree(filters):  # /org.openoffice.TypeDetection.Filter/Filtersを模した木を返す。Filtersはセットノードで、要素名に"/"を含むフィルタも1つ加える。
+    names = ["filter{:04}".format(i) for i in range(filters)] + ["MS Excel 97 Vorlage/Template"]
+    return {"org.openoffice.TypeDetection.Filter": {"Filters": SetData(FILTER_TEMPLATE, ((name, {
+        "DocumentService": "com.sun.star.text.TextDocument", "FileFormatVersion": 0, "Flags": ("IMPORT", "EXPORT", "ALIEN"),
+        "FilterService": "", "Type": "type{:04}".format(i), "UIComponent": "", "UserData": ("", ""), "UIName": "Filter {}".format(i)}) for i, name in enumerate(names)))}}
+FILTER_TEMPLATE = "org.openoffice.TypeDetection.Filter:Filter"  # configmgrのテンプレート名はコンポーネント名:名前。
+def createWideTree(nodes, leaves):  # nodes個のノードそれぞれにleaves個の葉を持つ木を返す。
+    return {"org.openoffice.Bench": {"Root": {"Node{:04}".format(i): {"Leaf{:04}".format(j): i*leaves+j for j in range(leaves)} for i in range(nodes)}}}
+
+
+def benchmarkSnapshotReader(latency=0.0005):  # getNode()で1つずつ取得する場合とスナップショットで取得する場合の呼び出し回数を比較する。
+    print("\n--- benchmark: snapshot reader ------------------------------------")
+    print("{:>6} {:>6} | {:>10} {:>9} | {:>10} {:>9}".format("nodes", "leaves", "getNode", "sec", "snapshot", "sec"))
+    for nodes, leaves in ((1, 8), (4, 8), (16, 8), (16, 32)):
+        cp = FakeProvider(createWideTree(nodes, leaves), latency)
+        paths = ["Node{:04}/Leaf{:04}".format(i, j) for i in range(nodes) for j in range(leaves)]
+        start = time.perf_counter()
+        root = Proxy(createConfigReader(cp)("/org.openoffice.Bench/Root"))
+        [root.getNode(path) for path in paths]  # 葉ごとに1回呼び出す。
+        root.dispose()
+        elapsed, calls = time.perf_counter()-start, cp.bridge.calls
+        cp.bridge.calls = 0
+        start = time.perf_counter()
+        createSnapshotReader(cp)("/org.openoffice.Bench/Root", "Node*/Leaf*")  # ノードごとに1回呼び出す。
+        print("{:>6} {:>6} | {:>10} {:>9.4f} | {:>10} {:>9.4f}".format(nodes, nodes*leaves, calls, elapsed, cp.bridge.calls, time.perf_counter()-start))
+
+def benchmarkConfigCache(latency=0.0005, reads=2000):  # 同じ葉を繰り返し読む場合のキャッシュの効果と変更後の一貫性を確認する。
+    print("\n--- benchmark: read-through cache ---------------------------------")
+    path = "/org.openoffice.Office.Calc/Grid"
+    leaves = "Option/VisibleGrid", "Resolution/XAxis/Metric", "Subdivision/XAxis", "Subdivision/YAxis"
+    cp = FakeProvider(createGridTree(), latency)
+    start = time.perf_counter()
+    for i in range(reads):
+        root = createConfigReader(cp)(path)  # 毎回根ノードを作成して取得する。
+        root.getHierarchicalPropertyValue(leaves[i%len(leaves)])
+        root.dispose()
+    print("uncached: {:>6} round-trips {:>9.4f} sec".format(cp.bridge.calls, time.perf_counter()-start))
+    cp.bridge.calls = 0
+    start = time.perf_counter()
+    with ConfigCache(cp, maxsize=16) as cache:
+        for i in range(reads):
+            cache.get(path, leaves[i%len(leaves)])
+        print("cached:   {:>6} round-trips {:>9.4f} sec".format(cp.bridge.calls, time.perf_counter()-start))
+        print(cache.cacheInfo())
+
+def benchmarkWalker(latency=0.0002, filters=400):  # EvaluatorとwalkNodes()の呼び出し回数とメモリ使用量を比較する。
+    print("\n--- benchmark: streaming walker ------------------------------------")
+    cp = FakeProvider(createFilterTree(filters), latency)
+    path = "/org.openoffice.TypeDetection.Filter/Filters"
+    for name, walk in (("Evaluator", lambda root: Evaluator().visit(root)), ("walkNodes", lambda root: (formatValue(*i) for i in walkNodes(root)))):
+        cp.bridge.calls = 0
+        root = createConfigReader(cp)(path)
+        tracemalloc.start()
+        start = time.perf_counter()
+        lines = sum(1 for line in walk(root))
+        elapsed = time.perf_counter()-start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print("{:<10} {:>6} lines {:>6} round-trips {:>9.4f} sec {:>9} bytes peak".format(name, lines, cp.bridge.calls, elapsed, peak))
+
+def connectCounted(logfile, tree, latency):  # 接続するたびにlogfileに1行書く。プロセスをまたいで数えられる。
+    with open(logfile, "a") as f:
+        f.write("{}\n".format(os.getpid()))
+    cp = FakeProvider(tree, latency)  # 接続ごとに別の偽ブリッジを作る。
+    _connected.add(cp)
+    return cp
+_connected = weakref.WeakSet()  # このプロセスで作って手放していない接続。
+def benchmarkParallelExport(latency=0.0005, filters=100):  # 接続数を変えて複数の根ノードを書き出す時間を比較する。
+    print("\n--- benchmark: parallel export -------------------------------------")
+    tree = createFilterTree(filters)
+    tree.update(createWideTree(50, 20))
+    paths = "/org.openoffice.TypeDetection.Filter/Filters", "/org.openoffice.Bench/Root"
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for processes, workers in ((False, 1), (False, 2), (False, 4), (False, 8), (True, 2), (True, 4)):
+            logfile = os.path.join(tmpdir, "{}-{}.log".format(processes, workers))
+            start = time.perf_counter()
+            events = list(exportConfigurations(partial(connectCounted, logfile, tree, latency), paths, workers, processes))
+            elapsed = time.perf_counter()-start
+            with open(logfile) as f:
+                connects = len(f.readlines())  # プロセスのときは一覧を取得する接続が加わる。
+            print("{} {}: {:>6} leaves {:>9.4f} sec {:>2} connects".format(workers, "processes" if processes else "threads  ", len(events), elapsed, connects))
+
+def rss():  # 現在の常駐メモリのバイト数を返す。Linuxのみ。
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1])*os.sysconf("SC_PAGE_SIZE")
+def benchmarkSnapshotFile(latency=0.0005, filters=2000, lookups=2000):  # 生きたブリッジ、JSONファイル、スナップショットファイルの検索時間とメモリ使用量を比較する。
+    print("\n--- benchmark: snapshot file ---------------------------------------")
+    cp = FakeProvider(createFilterTree(filters), latency)
+    path = "/org.openoffice.TypeDetection.Filter/Filters"
+    names = ["{}/{}".format(escapeSegment(FILTER_TEMPLATE, "filter{:04}".format(i*7919%filters)), "UIName" if i%2 else "Flags") for i in range(lookups)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        snapshotfile, jsonfile = os.path.join(tmpdir, "filters.snapshot"), os.path.join(tmpdir, "filters.json")
+        cp.bridge.latency = 0  # 書き出しは計測しない。
+        exportSnapshot(cp, snapshotfile, [path])
+        with SnapshotFile(snapshotfile) as snapshot, open(jsonfile, "w") as f:
+            json.dump(dict(snapshot.items()), f)
+        cp.bridge.latency = latency
+        def live():
+            root = createConfigReader(cp)(path)
+            return [root.getByHierarchicalName(name) for name in names[:lookups//20]]  # 遅いので一部だけ。セットノードにはXHierarchicalPropertySetがない。
+        def jsondump():
+            with open(jsonfile) as f:
+                values = json.load(f)
+            return [values["{}/{}".format(path, name)] for name in names]
+        def mmapped():
+            with SnapshotFile(snapshotfile) as snapshot:
+                root = snapshot(path)
+                return [root.getByHierarchicalName(name) for name in names]
+        for name, func, filename in (("snapshot", mmapped, snapshotfile), ("json", jsondump, jsonfile), ("live", live, None)):  # RSSは増える一方なので小さいものから計測する。
+            before = rss()
+            start = time.perf_counter()
+            count = len(func())
+            elapsed = time.perf_counter()-start
+            print("{:<9} {:>9.2f} usec/lookup {:>9} bytes RSS growth {:>9} bytes file ({} lookups)".format(
+                name, elapsed/count*1e6, rss()-before, os.path.getsize(filename) if filename else "-", count))
+
+class CountingListener:  # 通知の回数を数えるXChangesListenerの代わり。
+    def __init__(self):
+        self.events = 0
+        self.changes = 0
+    def changesOccurred(self, event):
+        self.events += 1
+        self.changes += len(event.Changes)
+    def disposing(self, source):
+        pass
+def benchmarkConfigBatch(latency=0.0005):  # 1つずつ書き込む場合とConfigBatchでまとめて書き込む場合の呼び出し回数と通知の回数を比較する。
+    print("\n--- benchmark: batched updater -------------------------------------")
+    path = "/org.openoffice.Office.Calc/Grid"
+    edits = [("Option", "VisibleGrid", False), ("Option", "SnapToGrid", True), ("Option", "SnapToGrid", False),  # 最後の値は今の値と同じ。
+             ("Subdivision", "XAxis", 2), ("Subdivision", "YAxis", 2), ("Subdivision", "YAxis", 3), ("Resolution/XAxis", "Metric", 500)]
+    for name in ("per field", "batch"):
+        cp = FakeProvider(createGridTree(), latency)
+        model = createConfigReader(cp)(path)
+        listener = CountingListener()
+        model.addChangesListener(listener)
+        cp.bridge.calls = 0
+        start = time.perf_counter()
+        if name=="batch":
+            with ConfigBatch(cp) as batch:
+                for node, leaf, value in edits:
+                    batch.set("{}/{}".format(path, node), leaf, value)
+        else:
+            for node, leaf, value in edits:
+                root = createConfigUpdater(cp)("{}/{}".format(path, node))
+                root.setHierarchicalPropertyValue(leaf, value)
+                root.commitChanges()
+                root.dispose()
+        elapsed = time.perf_counter()-start
+        print("{:<9}: {:>3} round-trips {:>3} notifications {:>3} changes {:>9.4f} sec".format(name, cp.bridge.calls, listener.events, listener.changes, elapsed))
+
+class RereadingListener:  # 通知ごとにモデルを読み直すChangesListenerの代わり。
+    def __init__(self, model):
+        self.model = model
+    def changesOccurred(self, event):
+        self.model.getHierarchicalPropertyValues(tuple(GRID_OPTIONS))
+    def disposing(self, source):
+        pass
+def burstEdits(cp, path, edits):  # 別のアクセスから1つずつ書き込んで通知を連続させ、かかった秒数を返す。
+    updater = createConfigUpdater(cp)(path)
+    start = time.perf_counter()
+    for i in range(edits):
+        updater.setHierarchicalPropertyValue("Subdivision/XAxis" if i%2 else "Subdivision/YAxis", i)
+        updater.commitChanges()
+    elapsed = time.perf_counter()-start
+    updater.dispose()
+    return elapsed
+def benchmarkChangesDispatcher(latency=0.0005, edits=200):  # 通知ごとに読み直す場合とChangesDispatcherでまとめる場合を比較する。
+    print("\n--- benchmark: changes dispatcher ----------------------------------")
+    path = "/org.openoffice.Office.Calc/Grid"
+    cp = FakeProvider(createGridTree(), latency)
+    model = createConfigReader(cp)(path)
+    listener = RereadingListener(model)
+    model.addChangesListener(listener)
+    cp.bridge.calls = 0
+    elapsed = burstEdits(cp, path, edits)
+    model.removeChangesListener(listener)
+    print("re-read:    {:>5} round-trips {:>9.4f} sec".format(cp.bridge.calls, elapsed))
+    deltas = []
+    dispatcher = ChangesDispatcher(window=0.02)
+    dispatcher.subscribe(deltas.append)  # 購読者は変更された値を受け取るので読み直さない。
+    model.addChangesListener(dispatcher)
+    cp.bridge.calls = 0
+    elapsed = burstEdits(cp, path, edits)
+    dispatcher.close()
+    model.removeChangesListener(dispatcher)
+    print("dispatcher: {:>5} round-trips {:>9.4f} sec {}".format(cp.bridge.calls, elapsed, dispatcher.metrics()))
+    async def run():  # asyncioのイベントループで配る。
+        loop = asyncio.get_event_loop()
+        dispatcher = ChangesDispatcher(window=0.02, loop=loop)
+        dispatcher.subscribe(deltas.append)
+        model.addChangesListener(dispatcher)
+        await loop.run_in_executor(None, burstEdits, cp, path, edits)  # 通知はブリッジのスレッドの代わりにエグゼキューターから来る。
+        dispatcher.close()
+        await asyncio.sleep(0)
+        model.removeChangesListener(dispatcher)
+        print("asyncio:    {}".format(dispatcher.metrics()))
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(run())
+    loop.close()
+
+class StubOffice:  # sofficeの代わり。起動と接続にかかる時間を模す。
+    def __init__(self, startup=0.3, connect=0.005, latency=0.0005):
+        self.startup = startup  # 起動と終了にかかる秒数。
+        self.connect = connect  # 接続にかかる秒数。
+        self.latency = latency
+        self.alive = True
+        self.tree = createGridTree()
+        self.providers = 0  # ConfigurationProviderを作成した回数。
+    def bootstrap(self):  # officehelper.bootstrap()の代わり。
+        time.sleep(self.startup)
+        return StubContext(self)
+    def resolve(self, url):  # UnoUrlResolver.resolve()の代わり。
+        time.sleep(self.connect)
+        if not self.alive:
+            raise ConnectionError(url)  # com.sun.star.connection.NoConnectExceptionの代わり。
+        return StubContext(self)
+    def terminate(self):
+        time.sleep(self.startup/2)
+class StubContext:  # コンポーネントコンテクストとサービスマネジャーの代わり。
+    def __init__(self, office):
+        self.office = office
+        self.disposed = False  # 接続が切れたときTrue。
+    def getServiceManager(self):
+        if self.disposed:
+            raise ConnectionError("disposed")  # com.sun.star.lang.DisposedExceptionの代わり。
+        return self
+    def createInstanceWithContext(self, service, ctx):
+        self.office.providers += 1
+        return FakeProvider(self.office.tree, self.office.latency)
+def benchmarkOfficeSession(tasks=5):  # タスクごとに起動・終了する場合とOfficeSessionで接続を使い回す場合の時間を比較する。
+    print("\n--- benchmark: office session ---------------------------------------")
+    office = StubOffice()
+    start = time.perf_counter()
+    for i in range(tasks):
+        ctx = office.bootstrap()  # connectOffice()と同じくタスクごとに起動して終了する。
+        readGridSnapshot(createProvider(ctx, ctx.getServiceManager()))
+        office.terminate()
+    print("bootstrap per task: {:>9.4f} sec for {} tasks".format(time.perf_counter()-start, tasks))
+    session = OfficeSession(resolve=office.resolve, backoff=0.01, interval=0)
+    start = time.perf_counter()
+    for i in range(tasks):
+        readGridSnapshot(session.getProvider())
+    print("pooled session:     {:>9.4f} sec for {} tasks ({} connect)".format(time.perf_counter()-start, tasks, session.connects))
+    session._ctx.disposed = True  # 接続が切れたときは再接続する。
+    office.alive = False
+    timer = threading.Timer(0.02, setattr, (office, "alive", True))  # 少し後にofficeが戻る。
+    timer.start()
+    readGridSnapshot(session.getProvider())
+    timer.join()
+    print("after reconnect:    {} connects".format(session.connects))
+
+class LegacyProxy:  # 書き換える前のProxy。比較のため。
+    def __init__(self, obj):
+        self._obj = obj
+    def getNode(self, *args):
+        delimset = {"/", ".", ":"}
+        if len(args)==1:
+            node = self._obj.getHierarchicalPropertyValue(*args) if delimset & set(*args) else self._obj.getPropertyValue(*args)
+            return LegacyProxy(node) if type(node).__name__=="pyuno" else node
+        elif len(args)>1:
+            nodes = self._obj.getHierarchicalPropertyValues(args) if delimset & set("".join(args)) else self._obj.getPropertyValues(args)
+            return [LegacyProxy(node) if type(node).__name__=="pyuno" else node for node in nodes]
+    def __getattr__(self, name):
+        return getattr(self._obj, name)
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value) if name.startswith('_') else setattr(self._obj, name, value)
+def benchmarkProxy(number=20000):  # 遅延のない偽ノードでProxyの1回の検索にかかる時間を比較する。
+    print("\n--- benchmark: proxy lookup -----------------------------------------")
+    cp = FakeProvider(createGridTree(), 0)
+    root = createConfigReader(cp)("/org.openoffice.Office.Calc/Grid")
+    cases = OrderedDict((
+        ("flat leaf", lambda proxy: proxy.getNode("Subdivision").getNode("XAxis")),
+        ("hierarchical leaf", lambda proxy: proxy.getNode("Resolution/XAxis/Metric")),
+        ("bulk leaves", lambda proxy: proxy.getNode("Subdivision/XAxis", "Subdivision/YAxis", "Option/VisibleGrid")),
+        ("child node", lambda proxy: proxy.getNode("Resolution").getNode("XAxis")),
+        ("forwarded method", lambda proxy: proxy.getElementNames()),
+    ))
+    print("{:<18} {:>12} {:>12}".format("usec/lookup", "before", "after"))
+    for name, case in cases.items():
+        results = [timeit.timeit(partial(case, cls(root)), number=number)/number*1e6 for cls in (LegacyProxy, Proxy)]
+        print("{:<18} {:>12.3f} {:>12.3f}".format(name, *results))
+
+def benchmarkDiff(nodes=200, leaves=200):  # 数個の葉だけが違う大きな木で、全部の葉を比べる場合とハッシュで部分木を飛ばす場合を比較する。
+    print("\n--- benchmark: structural diff --------------------------------------")
+    old = createWideTree(nodes, leaves)
+    new = copy.deepcopy(old)
+    root = new["org.openoffice.Bench"]["Root"]
+    root["Node0003"]["Leaf0007"] = -1
+    root["Node0150"]["Leaf0000"] = "changed"
+    del root["Node0042"]["Leaf0001"]
+    root["Node0199"]["Leaf9999"] = 0
+    start = time.perf_counter()
+    a, b = dict(flattenDict(old)), dict(flattenDict(new))
+    naive = sorted(path for path in set(a) | set(b) if a.get(path, KeyError)!=b.get(path, KeyError))
+    print("all leaves:       {:>9.4f} sec total {} differences".format(time.perf_counter()-start, len(naive)))
+    start = time.perf_counter()
+    count = sum(1 for i in diffTrees(buildHashTree(old), buildHashTree(new)))  # 木を作る時間も含める。
+    print("hash tree:        {:>9.4f} sec total {} differences".format(time.perf_counter()-start, count))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filenames = os.path.join(tmpdir, "old.snapshot"), os.path.join(tmpdir, "new.snapshot")
+        start = time.perf_counter()
+        for filename, tree in zip(filenames, (old, new)):  # exportSnapshot()と同じく絶対パスで書き出す。部分木のハッシュはここで計算する。
+            writeSnapshot(filename, (("/" + path, value) for path, value in flattenDict(tree)))
+        print("write snapshots:  {:>9.4f} sec (once per export)".format(time.perf_counter()-start))
+        with SnapshotFile(filenames[0]) as oldfile, SnapshotFile(filenames[1]) as newfile:
+            start = time.perf_counter()
+            a, b = dict(oldfile.items()), dict(newfile.items())
+            count = sum(1 for path in set(a) | set(b) if a.get(path, KeyError)!=b.get(path, KeyError))
+            print("snapshot leaves:  {:>9.4f} sec total {} differences".format(time.perf_counter()-start, count))
+            start = time.perf_counter()
+            differences = list(diffTrees(oldfile(""), newfile("")))  # diffMain()と同じ。ハッシュが同じ部分木の葉はデコードしない。
+            print("snapshot digests: {:>9.4f} sec total {} differences".format(time.perf_counter()-start, len(differences)))
+    for difference in differences:
+        print("    {}".format(difference))
+    oldcp, newcp = FakeProvider(old, 0), FakeProvider(new, 0)  # 生きたブリッジの根ノード同士も比べられる。
+    path = "/org.openoffice.Bench/Root"
+    start = time.perf_counter()
+    count = sum(1 for i in diffTrees(createConfigReader(oldcp)(path), createConfigReader(newcp)(path)))
+    print("live roots:       {:>9.4f} sec total {} differences {} round-trips".format(time.perf_counter()-start, count, oldcp.bridge.calls + newcp.bridge.calls))
+
+def benchmarkTracer(latency=0.0002):  # 遅延を注入した偽のConfigurationProviderで例を実行して記録を確認する。無効のときのオーバーヘッドも計測する。
+    print("\n--- benchmark: bridge tracer ----------------------------------------")
+    tree = createGridTree()
+    tree.update(createFilterTree(20))
+    cp = FakeProvider(tree, latency)
+    slowpath = "/org.openoffice.Office.Calc/Grid/Resolution"
+    cp.delays[slowpath] = 0.02  # このノードの取得だけを遅くする。
+    tracer = BridgeTracer()
+    traced = tracer.wrap(cp)
+    with redirect_stdout(io.StringIO()):  # 例の出力は捨てる。
+        readGridConfiguration(traced)
+        printRegisteredFilters(traced)
+        editGridOptions(traced)
+    print(tracer.report(5))
+    print("histogram of {}: {}".format(slowpath, dict(tracer.histograms()[slowpath])))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "trace.json")
+        tracer.exportChromeTrace(filename)
+        with open(filename) as f:
+            print("chrome trace: {} events".format(len(json.load(f)["traceEvents"])))
+    cp = FakeProvider(createGridTree(), 0)
+    root = createConfigReader(cp)("/org.openoffice.Office.Calc/Grid")
+    for name, node in (("untraced", root), ("disabled", BridgeTracer(enabled=False).wrap(root)), ("enabled", BridgeTracer().wrap(root))):
+        usec = timeit.timeit(partial(node.getHierarchicalPropertyValue, "Option/VisibleGrid"), number=20000)/20000*1e6
+        print("{:<9} {:>7.3f} usec/call".format(name, usec))
+
+
+BENCHMARKS = OrderedDict((
+    ("snapshot", benchmarkSnapshotReader),
+    ("cache", benchmarkConfigCache),
+    ("walker", benchmarkWalker),
+    ("export", benchmarkParallelExport),
+    ("snapshotfile", benchmarkSnapshotFile),
+    ("batch", benchmarkConfigBatch),
+    ("dispatcher", benchmarkChangesDispatcher),
+    ("session", benchmarkOfficeSession),
+    ("proxy", benchmarkProxy),
+    ("diff", benchmarkDiff),
+    ("tracer", benchmarkTracer),
+))
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:  # 引数がないときはすべて実行する。
+        BENCHMARKS[name]()
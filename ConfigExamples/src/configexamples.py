@@ -1,19 +1,35 @@
 #!/opt/libreoffice5.2/program/python
 # -*- coding: utf-8 -*-
+import uno
 import unohelper
 import officehelper
 import traceback
-from functools import wraps
+from functools import wraps, partial, lru_cache
 import sys
 from com.sun.star.beans import PropertyValue
-from collections import namedtuple
+from collections import namedtuple, OrderedDict, Counter, deque
+import fnmatch
+import re
 from com.sun.star.uno import RuntimeException
 from com.sun.star.util import XChangesListener
 import types
+import threading
+import queue
+import struct
+import time
+import hashlib
+import mmap
+import math
+import json
+import os
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import contextmanager
 
 
-def main(ctx, smgr):  # ctx: コンポーネントコンテクスト、smgr: サービスマネジャー
-    cp = createProvider(ctx, smgr)  # ConfigurationProviderの取得。
+def main(ctx, smgr, cp=None):  # ctx: コンポーネントコンテクスト、smgr: サービスマネジャー、cp: OfficeSessionで使い回すConfigurationProvider
+    tracer = BridgeTracer(enabled="CONFIGEXAMPLES_TRACE" in os.environ)  # 環境変数CONFIGEXAMPLES_TRACEにファイル名があるときはブリッジ越しの呼び出しを記録する。
+    cp = tracer.wrap(createProvider(ctx, smgr) if cp is None else cp)  # ConfigurationProviderの取得。
     if checkProvider(cp):
         print("\nStarting examples.")
         readDataExample(cp)  # /org.openoffice.Office.Calc/Grid以下の特定の値を取得する例。
@@ -23,6 +39,9 @@ def main(ctx, smgr):  # ctx: コンポーネントコンテクスト、smgr: サ
         print("\nAll Examples completed.")
     else:
         print("ERROR: Cannot run examples without ConfigurationProvider.")
+    if tracer.enabled:
+        print("\n{}".format(tracer.report()))
+        tracer.exportChromeTrace(os.environ["CONFIGEXAMPLES_TRACE"])
 def createProvider(ctx, smgr):  # ConfigurationProviderをインスタンス化。引数なしでインスタンス化しているのでDefaultProviderが返る。
     return smgr.createInstanceWithContext("com.sun.star.configuration.ConfigurationProvider", ctx)
 def checkProvider(cp):  # ConfigurationProviderの情報を取得。
@@ -46,8 +65,12 @@ def checkProvider(cp):  # ConfigurationProviderの情報を取得。
 def readDataExample(cp):  # /org.openoffice.Office.Calc/Grid以下の特定の値を取得する例。
     try:
         print("\n--- starting example: read grid option settings --------------------")
-        options = readGridConfiguration(cp)  # namedtupleを受け取る。
-        print("Read grid options: {}".format(options))
+        counter = RoundTripCounter()  # ブリッジ越しの呼び出し回数を数える。
+        options = readGridConfiguration(counter.wrap(cp))  # namedtupleを受け取る。
+        print("Read grid options: {} ({} round-trips)".format(options, counter.count))
+        counter.reset()
+        options = readGridSnapshot(counter.wrap(cp))  # ノードごとにまとめて取得する。
+        print("Read grid snapshot: {} ({} round-trips)".format(options, counter.count))
     except:
         traceback.print_exc()
 def readGridConfiguration(cp):  # 設定ファイルの読み込み
@@ -65,27 +88,314 @@ def createConfigReader(cp):  # ConfigurationProviderサービスのインスタ
         return cp.createInstanceWithArguments("com.sun.star.configuration.ConfigurationAccess", (node,))
     return getRoot
 class Proxy:  # Proxyパターンでインスタンスにメソッドを追加する。
-    def __init__(self, obj):  # メソッドを追加するインスタンスを取得。
+    __slots__ = ("_obj", "_path", "_nodes", "_methods")  # インスタンス辞書の作成抑制。
+    def __init__(self, obj, path="", nodes=None):  # メソッドを追加するインスタンスを取得。
         self._obj = obj
+        self._path = path  # 根ノードからのパス。
+        self._nodes = {} if nodes is None else nodes  # 根ノードと共有する子ノードのProxyの辞書。キー: 根ノードからのパス。
+        self._methods = {}  # 取得済のメソッドのキャッシュ。
     def getNode(self, *args):  # インスタンスに追加するメソッド。
-        delimset = {"/", ".", ":"}  # パス区切り一覧
         if len(args)==1:  # 引数の数が1つのとき
-            node = self._obj.getHierarchicalPropertyValue(*args) if delimset & set(*args) else self._obj.getPropertyValue(*args)  # パス区切りの有無でgetHierarchicalPropertyValue()とgetPropertyValue()を使い分ける。
-            return Proxy(node) if type(node).__name__=="pyuno" else node  # nodeがPyUNOオブジェクトのときはProxyクラスのインスタンスを返し、そうでないときはそのまま返す。
+            name = args[0]
+            key = "{}/{}".format(self._path, name) if self._path else name
+            if key in self._nodes:  # 取得済の子ノードのときはブリッジを呼び出さない。
+                return self._nodes[key]
+            node = self._obj.getHierarchicalPropertyValue(name) if isHierarchicalName(name) else self._obj.getPropertyValue(name)  # パス区切りの有無でgetHierarchicalPropertyValue()とgetPropertyValue()を使い分ける。
+            return self._intern(key, node) if isPyUNO(node) else node  # nodeがPyUNOオブジェクトのときはProxyクラスのインスタンスを返し、そうでないときはそのまま返す。
         elif len(args)>1:  # 引数の数が2つ以上のとき
-            nodes = self._obj.getHierarchicalPropertyValues(args) if delimset & set("".join(args)) else self._obj.getPropertyValues(args)  # パス区切りの有無でgetHierarchicalPropertyValues()とgetPropertyValues()を使い分ける。
-            return [Proxy(node) if type(node).__name__=="pyuno" else node for node in nodes]  # 各ノードについてPyUNOオブジェクトのときはProxyクラスのインスタンスを、そうでないときはそのままを要素にしたリストを返す。
+            nodes = self._obj.getHierarchicalPropertyValues(args) if isHierarchicalNames(args) else self._obj.getPropertyValues(args)  # パス区切りの有無でgetHierarchicalPropertyValues()とgetPropertyValues()を使い分ける。
+            if not any(isPyUNO(node) for node in nodes):  # 値だけのときはそのまま返す。
+                return nodes
+            return tuple(self._intern("{}/{}".format(self._path, name) if self._path else name, node) if isPyUNO(node) else node for name, node in zip(args, nodes))  # 各ノードについてPyUNOオブジェクトのときはProxyクラスのインスタンスを、そうでないときはそのままを要素にしたタプルを返す。
+    def _intern(self, key, node):  # 子ノードのProxyを作成して根ノードの辞書に登録する。
+        proxy = self._nodes[key] = Proxy(node, key, self._nodes)
+        return proxy
     def __getattr__(self, name):  # Proxyクラス属性にnameが見つからなかったときにnameを引数にして呼び出されます。__setattr__()や __delattr__()が常に呼び出されるのとは対照的です。
-        return getattr(self._obj, name)  # Proxyクラスのインスタンスが取得したインスタンスの属性としてnameを呼び出す。
+        methods = self._methods
+        if name in methods:
+            return methods[name]
+        attr = getattr(self._obj, name)  # Proxyクラスのインスタンスが取得したインスタンスの属性としてnameを呼び出す。
+        if callable(attr):  # メソッドはキャッシュする。値の属性は変わるのでキャッシュしない。
+            methods[name] = attr
+        return attr
     def __setattr__(self, name, value):  # アンダースコアが始まる属性名のときはProxyの属性にvalueを代入し、そうでない時はProxyクラスのインスタンスが取得したインスタンスの属性にvalueを代入する。
         super().__setattr__(name, value) if name.startswith('_') else setattr(self._obj, name, value)
     def __delattr__(self, name):  # アンダースコアが始まる属性名のときはProxyの属性を削除し、そうでない時はProxyクラスのインスタンスが取得したインスタンスの属性を削除する。
         super().__delattr__(name) if name.startswith('_') else delattr(self._obj, name)   
+@lru_cache(maxsize=4096)
+def isHierarchicalName(name):  # パス区切りを含むときTrueを返す。
+    return not PATH_DELIMITERS.isdisjoint(name)
+@lru_cache(maxsize=1024)
+def isHierarchicalNames(names):  # どれかがパス区切りを含むときTrueを返す。
+    return any(isHierarchicalName(name) for name in names)
+PATH_DELIMITERS = frozenset("/.:")  # パス区切り一覧
 class GridOptions(namedtuple("GridOptions", "visible resolution_x resolution_y subdivision_x subdivision_y")):  # namedtupleの__str__()メソッドを上書きする。
     __slots__ = ()  # インスタンス辞書の作成抑制。
     def __str__(self):  # 文字列として呼ばれた場合に返す値を設定。
         return "[ Grid is {0}; resolution = ({1},{2}); subdivision = ({3},{4}) ]"\
             .format("VISIBLE" if self.visible else "HIDDEN", self.resolution_x, self.resolution_y, self.subdivision_x, self.subdivision_y)
+GRID_OPTIONS = OrderedDict((("Option/VisibleGrid", "visible"), ("Resolution/XAxis/Metric", "resolution_x"), ("Resolution/YAxis/Metric", "resolution_y"), ("Subdivision/XAxis", "subdivision_x"), ("Subdivision/YAxis", "subdivision_y")))  # キー: /org.openoffice.Office.Calc/Gridからのパス、値: GridOptionsのフィールド名。
+def readGridSnapshot(cp):  # readGridConfiguration()と同じ値を1回の呼び出しで取得する。
+    snapshotreader = createSnapshotReader(cp)  # スナップショットを返す関数を取得。
+    snapshot = snapshotreader("/org.openoffice.Office.Calc/Grid", tuple(GRID_OPTIONS))  # "Subdivision/*"のようにglobパターンも使える。
+    return GridOptions(*snapshot)
+def createSnapshotReader(cp):  # ConfigurationProviderサービスのインスタンスを受け取る高階関数。
+    configreader = createConfigReader(cp)  # 読み込み専用の関数を取得。
+    def readSnapshot(path, leaves, typename="Snapshot"):  # 根ノードpath以下の葉leaves(パスのリストかglobパターン)の値を名前付きタプルで返す関数。
+        root = configreader(path)  # 引数のパスで根ノードを取得。
+        try:
+            leaves = expandLeaves(root, (leaves,) if isinstance(leaves, str) else leaves)  # globパターンを葉のパスに展開する。
+            if hasattr(root, "getHierarchicalPropertyValues"):  # グループノードのときはすべての葉を1回の呼び出しで取得する。
+                values = dict(zip(leaves, root.getHierarchicalPropertyValues(leaves)))
+            else:  # セットノードはXMultiHierarchicalPropertySetをサポートしていないので要素ごとに1回ずつ呼び出す。
+                values = {}
+                for segment, paths in planReads(leaves).items():
+                    element = root.getByHierarchicalName(segment)
+                    values.update(zip(paths, element.getHierarchicalPropertyValues(tuple(i[len(segment) + 1:] for i in paths))))
+            return snapshotType(typename, tuple(leaves))(*(values[leaf] for leaf in leaves))  # 変更不可の名前付きタプルにして返す。
+        finally:
+            root.dispose()  # ConfigurationAccessサービスのインスタンスを破棄。
+    return readSnapshot
+def expandLeaves(root, patterns):  # globパターンを含むパスを葉のパスのリストに展開する。
+    leaves = []
+    names = {}  # 取得済の子ノードの(名前, パスに使う名前)のリストのキャッシュ。キー: 親ノードのパス。
+    def getElementNames(path):  # pathのノードの子ノードの(名前, パスに使う名前)のリストを返す。
+        if path not in names:
+            node = root.getByHierarchicalName(path) if path else root
+            elements = node.getElementNames()
+            if hasattr(node, "getPropertyValues"):  # グループノードのとき
+                names[path] = [(name, name) for name in elements]
+            else:  # セット要素名はiterChildren()と同じくエスケープする。
+                template = node.getElementTemplateName()
+                names[path] = [(name, escapeSegment(template, name)) for name in elements]
+        return names[path]
+    for pattern in patterns:
+        paths = [""]
+        for segment in splitPath(pattern):
+            if GLOB_CHARS.search(segment) and not ESCAPED_SEGMENT.fullmatch(segment):  # パターンのとき。エスケープする前の名前と照合する。エスケープしたセット要素名はパターンにしない。
+                paths = ["{}/{}".format(path, child) if path else child for path in paths for name, child in getElementNames(path) if fnmatch.fnmatch(name, segment)]
+            else:
+                paths = ["{}/{}".format(path, segment) if path else segment for path in paths]
+        leaves.extend(path for path in paths if path not in leaves)  # 重複は除く。
+    return leaves
+GLOB_CHARS = re.compile(r"[*?[]")  # globパターンに使う文字。
+def planReads(leaves):  # 葉のパスを根ノードの子ノードごとにまとめる。
+    plan = OrderedDict()
+    for leaf in leaves:
+        plan.setdefault(splitPath(leaf)[0], []).append(leaf)
+    return OrderedDict((k, tuple(v)) for k, v in plan.items())
+@lru_cache()
+def snapshotType(typename, leaves):  # 葉のパスをフィールド名にした名前付きタプルのクラスを返す。
+    fields = [re.sub(r"\W", "_", leaf) for leaf in leaves]  # 識別子に使えない文字を置換する。
+    return type(typename, (namedtuple(typename, fields, rename=True),), {"__slots__": (), "paths": leaves})  # pathsクラス属性に元のパスを残す。
+def isPyUNO(obj):  # PyUNOオブジェクトかそれを包むProxy、またはSnapshotNodeのときTrueを返す。
+    t = type(obj)
+    if t not in _unotypes:  # 型ごとに1回だけ判定する。
+        _unotypes[t] = t.__name__=="pyuno" or issubclass(t, (RecordingProxy, SnapshotNode))
+    return _unotypes[t]
+_unotypes = {}  # キー: 型、値: isPyUNO()の結果。
+class RoundTripCounter:  # ブリッジ越しのメソッド呼び出しの回数を数える。
+    def __init__(self):
+        self.count = 0  # 呼び出しの総数。
+        self.methods = Counter()  # メソッド名ごとの呼び出し数。
+    def wrap(self, obj, path=""):  # ConfigurationProviderなどをRecordingProxyで包んで返す。Noneはそのまま返す。
+        return obj if obj is None else RecordingProxy(obj, self, path)
+    def record(self, method, path, start, duration, args, result):  # RecordingProxyから呼ばれる。
+        self.count += 1
+        self.methods[method] += 1
+    def reset(self):
+        self.count = 0
+        self.methods.clear()
+class RecordingProxy:  # メソッドの呼び出しをrecorder(RoundTripCounterかBridgeTracer)に記録させるProxy。戻り値のノードも同じrecorderで包む。
+    __slots__ = ("_obj", "_recorder", "_path", "_template")
+    def __init__(self, obj, recorder, path=""):
+        self._obj = obj
+        self._recorder = recorder
+        self._path = path  # このノードのパス。
+        self._template = None  # セットノードの要素のテンプレート名。初めて要素名を記録するときに取得する。
+    def _elementTemplate(self):  # セットノードのときは要素のテンプレート名、それ以外のときは空文字を返す。
+        if self._template is None:
+            obj = self._obj
+            if hasattr(obj, "getPropertyValues") or not hasattr(obj, "getElementTemplateName"):  # グループノードやサービスのとき
+                self._template = ""
+            else:  # 取得もブリッジの呼び出しなので記録する。
+                start = time.perf_counter()
+                self._template = obj.getElementTemplateName()
+                self._recorder.record("getElementTemplateName", self._path, start, time.perf_counter() - start, (), self._template)
+        return self._template
+    def __getattr__(self, name):
+        attr = getattr(self._obj, name)
+        if not callable(attr):  # メソッドでないときはそのまま返す。
+            return attr
+        recorder, path = self._recorder, self._path
+        def call(*args):
+            start = time.perf_counter()
+            result = attr(*args)
+            duration = time.perf_counter() - start
+            template = self._elementTemplate() if args and isinstance(args[0], str) and "Hierarchical" not in name else ""  # セットノードの要素名はエスケープしたパスにする。
+            callpath = tracePath(path, args, template)
+            recorder.record(name, callpath, start, duration, args, result)
+            if isinstance(result, tuple):  # getPropertyValues()などの戻り値のとき
+                names = args[0] if args and isinstance(args[0], tuple) and len(args[0])==len(result) else ()
+                return tuple(recorder.wrap(v, tracePath(path, (n,)) if names else callpath) if isPyUNO(v) else v for n, v in zip(names or result, result))
+            return recorder.wrap(result, callpath) if isPyUNO(result) else result
+        return call
+TraceRecord = namedtuple("TraceRecord", "method path start duration size thread")  # startとdurationは秒。sizeは引数と戻り値のおおよそのバイト数。
+CallStats = namedtuple("CallStats", "method path count total max")  # BridgeTracer.top()の要素。
+class BridgeTracer:  # ブリッジ越しの呼び出しをメソッド、パス、時間、大きさで記録する。enabledがFalseのときはwrap()が引数をそのまま返すので何も記録しない。
+    def __init__(self, enabled=True, maxrecords=100000):
+        self.enabled = enabled
+        self.records = deque(maxlen=maxrecords)  # 古い記録から捨てる。
+        self._origin = time.perf_counter()
+    def wrap(self, obj, path=""):  # ConfigurationProviderなどをRecordingProxyで包んで返す。Noneはそのまま返すのでcheckProvider()で判定できる。
+        return RecordingProxy(obj, self, path) if self.enabled and obj is not None else obj
+    def record(self, method, path, start, duration, args, result):  # RecordingProxyから呼ばれる。
+        self.records.append(TraceRecord(method, path, start - self._origin, duration, payloadSize(args) + payloadSize(result), threading.get_ident()))
+    def top(self, n=10, key="total"):  # keyがtotal、max、countの多い順に(メソッド, パス)ごとの統計をn個返す。
+        stats = {}
+        for record in list(self.records):
+            k = record.method, record.path
+            count, total, maximum = stats.get(k, (0, 0, 0))
+            stats[k] = count + 1, total + record.duration, max(maximum, record.duration)
+        items = [CallStats(method, path, *v) for (method, path), v in stats.items()]
+        return sorted(items, key=lambda i: getattr(i, key), reverse=True)[:n]
+    def histograms(self):  # パスごとに呼び出し時間の分布を返す。キー: マイクロ秒の2の累乗の上限。
+        histograms = {}
+        for record in list(self.records):
+            bucket = 2**max(0, math.ceil(math.log2(max(record.duration*1e6, 1))))
+            histograms.setdefault(record.path, Counter())[bucket] += 1
+        return histograms
+    def report(self, n=10):  # 遅い呼び出しと多い呼び出しの上位n個を文字列で返す。
+        lines = ["{} bridge calls, {:.3f} sec".format(len(self.records), sum(i.duration for i in self.records))]
+        for key in ("total", "count"):
+            lines.append("top {} by {}:".format(n, key))
+            lines.extend("  {:>6} calls {:>9.3f} ms total {:>9.3f} ms max  {}({})".format(i.count, i.total*1e3, i.max*1e3, i.method, i.path) for i in self.top(n, key))
+        return "\n".join(lines)
+    def exportChromeTrace(self, filename):  # chrome://tracingやPerfettoで開けるJSONファイルに書き出す。
+        pid = os.getpid()
+        events = [{"name": i.method, "cat": "uno", "ph": "X", "ts": i.start*1e6, "dur": i.duration*1e6, "pid": pid, "tid": i.thread, "args": {"path": i.path, "size": i.size}} for i in list(self.records)]
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+def tracePath(path, args, template=""):  # 呼び出しの対象のパスを返す。templateはセットノードの要素のテンプレート名。
+    if args and isinstance(args[0], str) and not args[0].startswith("com.sun.star."):  # 子ノード名や相対パスのとき
+        segment = escapeSegment(template, args[0]) if template else args[0]
+        return "{}/{}".format(path, segment) if path else segment
+    for arg in args:  # createInstanceWithArguments()のnodepathのとき
+        if isinstance(arg, tuple):
+            for i in arg:
+                if getattr(i, "Name", None)=="nodepath":
+                    return i.Value
+    return path
+def payloadSize(obj):  # 値のおおよそのバイト数を返す。ノードは数えない。
+    if isinstance(obj, (str, bytes)):
+        return len(obj)
+    if isinstance(obj, (tuple, list)):
+        return sum(payloadSize(i) for i in obj)
+    if obj is None or isPyUNO(obj):
+        return 0
+    return 8
+CacheInfo = namedtuple("CacheInfo", "hits misses invalidations evictions currsize maxsize")  # ConfigCacheの統計。
+class ConfigCache:  # ConfigurationAccessの根ノードを開いたままにして葉の値をLRUでキャッシュする。変更はXChangesListenerで受け取って該当するパスだけ無効にする。
+    def __init__(self, cp, maxsize=1024):
+        self._configreader = createConfigReader(cp)  # 読み込み専用の関数を取得。
+        self._roots = {}  # キー: 根ノードのパス、値: (根ノード, リスナー)のタプル。
+        self._values = OrderedDict()  # キー: (根ノードのパス, 葉のパス)のタプル。古いものから順に並ぶ。
+        self._leaves = {}  # キー: 根ノードのパス、値: キャッシュしている葉のパスの集合。無効化の検索用。
+        self._generations = {}  # キー: 根ノードのパス、値: 無効化の回数。取得中に変更されたときに古い値を入れないため。
+        self._lock = threading.RLock()  # リスナーはブリッジのスレッドから呼ばれる。
+        self.maxsize = maxsize  # キャッシュする葉の最大数。
+        self.hits = self.misses = self.invalidations = self.evictions = 0
+    def getRoot(self, path):  # 開いたままの根ノードを返す。初回はリスナーを付ける。
+        with self._lock:
+            if path not in self._roots:
+                root = self._configreader(path)  # 引数のパスで根ノードを取得。
+                listener = CacheInvalidator(self, path)
+                root.addChangesListener(listener)
+                self._roots[path] = root, listener
+                self._leaves[path] = set()
+                self._generations[path] = 0
+            return self._roots[path][0]
+    def get(self, path, leaf):  # 根ノードpath以下の葉leafの値を返す。
+        return self.getValues(path, (leaf,))[0]
+    def getValues(self, path, leaves):  # 根ノードpath以下の葉leavesの値のタプルを返す。キャッシュにないものは1回の呼び出しでまとめて取得する。
+        values = {}
+        with self._lock:
+            for leaf in leaves:
+                key = path, leaf
+                if key in self._values:
+                    self._values.move_to_end(key)  # 最近使ったものにする。
+                    values[leaf] = self._values[key]
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            missing = tuple(leaf for leaf in OrderedDict.fromkeys(leaves) if leaf not in values)  # 重複を除いた取得していない葉。
+            root = self.getRoot(path) if missing else None
+            generation = self._generations.get(path)
+        if missing:
+            fetched = root.getHierarchicalPropertyValues(missing)  # ロックの外でブリッジを呼び出す。
+            values.update(zip(missing, fetched))
+            with self._lock:
+                if self._generations.get(path)==generation:  # 取得中に変更がなかったときだけキャッシュする。
+                    for leaf, value in zip(missing, fetched):
+                        if not isPyUNO(value):  # ノードはキャッシュしない。
+                            self._store(path, leaf, value)
+        return tuple(values[leaf] for leaf in leaves)
+    def _store(self, path, leaf, value):
+        self._values[(path, leaf)] = value
+        self._leaves[path].add(leaf)
+        while len(self._values)>self.maxsize:  # 最大数を超えたら古いものから捨てる。
+            (oldpath, oldleaf), _ = self._values.popitem(last=False)
+            self._leaves[oldpath].discard(oldleaf)
+            self.evictions += 1
+    def invalidate(self, path, accessor=None):  # 根ノードpath以下のaccessorに関係する葉をキャッシュから除く。accessorがNoneのときは根ノード以下すべて。
+        with self._lock:
+            if path not in self._leaves:
+                return
+            self._generations[path] += 1
+            leaves = self._leaves[path]
+            if accessor is None:
+                affected = set(leaves)
+            else:  # accessor自身、accessor以下の葉、accessorを含むノードの値。
+                affected = {leaf for leaf in leaves if leaf==accessor or leaf.startswith(accessor + "/") or accessor.startswith(leaf + "/")}
+            for leaf in affected:
+                del self._values[(path, leaf)]
+            leaves -= affected
+            self.invalidations += len(affected)
+    def cacheInfo(self):  # 統計を返す。
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.invalidations, self.evictions, len(self._values), self.maxsize)
+    def close(self):  # リスナーを外して根ノードを破棄する。
+        with self._lock:
+            roots, self._roots = self._roots, {}
+            self._values.clear()
+            self._leaves.clear()
+            self._generations.clear()
+        for root, listener in roots.values():
+            try:
+                root.removeChangesListener(listener)
+                root.dispose()  # ConfigurationAccessサービスのインスタンスを破棄。
+            except:
+                traceback.print_exc()
+    def _release(self, path):  # 根ノードが破棄されたときに呼ばれる。
+        with self._lock:
+            self.invalidate(path)
+            self._roots.pop(path, None)
+            self._leaves.pop(path, None)
+            self._generations.pop(path, None)
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+class CacheInvalidator(unohelper.Base, XChangesListener):  # ConfigCacheの根ノードに付けるリスナー。
+    def __init__(self, cache, path):
+        self.cache = cache
+        self.path = path  # リスナーを付けた根ノードのパス。
+    def changesOccurred(self, event):  # 変更されたパスのキャッシュだけを無効にする。
+        for change in event.Changes:
+            accessor = change.Accessor  # 根ノードからの相対パス。
+            self.cache.invalidate(self.path, accessor.strip("/") if isinstance(accessor, str) and accessor else None)  # パスでないときは根ノード以下すべてを無効にする。
+    def disposing(self, source):  # 根ノードが破棄されたときはキャッシュも捨てる。
+        self.cache._release(self.path)
 
 
 def browseDataExample(cp):  # /org.openoffice.TypeDetection.Filter/Filters以下の値一覧を出力する例。
@@ -97,17 +407,150 @@ def browseDataExample(cp):  # /org.openoffice.TypeDetection.Filter/Filters以下
 def printRegisteredFilters(cp):
     configreader = createConfigReader(cp)  # 読み込み専用の関数を取得。
     root = configreader("/org.openoffice.TypeDetection.Filter/Filters")  # 引数のパスで根ノードを取得。
-    e = Evaluator()  # Visitorパターンをインスタンス化。
-    output = e.visit(root)  # VisitorパターンでCompositeパターンに出力機能を追加。リストを取得。
-    print("\n".join(output))  # リストの要素を改行して出力。
+    for path, value in walkNodes(root, nodes=True):  # 1行ずつ出力するのでリストに溜めない。
+        if not isPyUNO(value):  # 葉のとき
+            print(formatValue(path, value))
+        elif hasattr(value, "getTemplateName") and value.getTemplateName().endswith("Filter"):
+            print("Filter {} ({})".format(value.getName(), value.getHierarchicalName()))
     root.dispose()  # ConfigurationAccessサービスのインスタンスを破棄。
+def formatValue(path, value):  # 葉の値を1行の文字列にする。
+    if isinstance(value, tuple):  # タプルの時
+        return "\tValue: {0} = {{{1}}}".format(path, ", ".join(value))
+    return "\tValue: {} = {}".format(path, value)
+def walkNodes(root, maxdepth=None, prune=(), nodes=False, path=None):  # 根ノード以下を深さ優先でたどって(パス, 値)を1つずつ返すジェネレーター。pathは根ノードのパス。
+    prune = tuple(i.rstrip("/") for i in prune)  # この絶対パス以下はたどらない。
+    stack = [iterChildren(root, root.getHierarchicalName() if path is None else path)]  # 深さごとの子ノードのイテレーター。メモリは深さと子ノード数の分だけ使う。
+    while stack:
+        for path, value in stack[-1]:
+            if prune and any(path==i or path.startswith(i + "/") for i in prune):  # 枝刈り。
+                continue
+            if not isPyUNO(value):  # 葉のとき
+                yield path, value
+                continue
+            if nodes:  # ノードも返すとき
+                yield path, value
+            if maxdepth is None or len(stack)<maxdepth:  # 深さの制限内のときは子ノードに進む。
+                stack.append(iterChildren(value, path))
+                break
+        else:  # 子ノードをすべてたどったとき
+            stack.pop()
+def iterChildren(node, path):  # ノードの子を(パス, 値)のイテレーターで返す。
+    names = node.getElementNames()
+    if hasattr(node, "getPropertyValues"):  # グループノードのときは1回の呼び出しですべての子を取得する。
+        return (("{}/{}".format(path, name), value) for name, value in zip(names, node.getPropertyValues(names)))
+    template = node.getElementTemplateName()  # セットノードはXMultiPropertySetをサポートしていないので1つずつ取得する。
+    return (("{}/{}".format(path, escapeSegment(template, name)), node.getByName(name)) for name in names)  # 要素名は"/"を含みうるのでエスケープする。
+def escapeSegment(template, name):  # configmgrと同じくセット要素名をテンプレート名['要素名']にする。
+    if not template:
+        return name
+    return "{}['{}']".format(template, name.replace("&", "&amp;").replace('"', "&quot;").replace("'", "&apos;"))
+def segmentName(segment):  # escapeSegment()の逆。エスケープしていない名前はそのまま返す。
+    match = ESCAPED_SEGMENT.fullmatch(segment)
+    if match is None:
+        return segment
+    return match.group(3).replace("&apos;", "'").replace("&quot;", '"').replace("&amp;", "&")
+ESCAPED_SEGMENT = re.compile(r"""([^/\[]*)\[(['"])(.*)\2\]""")  # テンプレート名['要素名']。テンプレート名が*のものも読める。
+def splitPath(path):  # パスを名前のリストにする。エスケープしたセット要素名の中の"/"では分けない。
+    return PATH_SEGMENT.findall(path)
+PATH_SEGMENT = re.compile(r"""[^/\[]*\[(?:'[^']*'|"[^"]*")\]|[^/]+""")
+def exportConfigurations(connect, paths, workers=4, processes=False):  # 根ノードpathsの子ノードごとに分けて並列にたどり、葉の(パス, 値)をpathsと子ノードの順に返すジェネレーター。
+    connects = list(connect) if isinstance(connect, (list, tuple)) else [connect]  # ConfigurationProviderを返す関数。複数のofficeに接続するときはリストにする。
+    pool = ConnectionPool(connects, workers)
+    try:
+        with pool.connection() as cp:
+            tasks = listSubtrees(cp, paths)  # (根ノードのパス, 子ノードのパス, 子ノード名)のタプルのリスト。
+        if processes:  # プロセスごとに接続する。connectsはpicklableでないといけない。
+            executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))  # ブリッジのスレッドがあるプロセスをforkしない。
+            func = partial(exportSubtreeInProcess, connects)
+            args = ([i%len(connects) for i in range(len(tasks))],)  # 子ノードごとに順番に接続先の番号を割り当てる。
+        else:  # スレッドごとにプールから接続を借りる。
+            executor = ThreadPoolExecutor(workers)
+            func = partial(exportSubtreeInPool, pool)
+            args = ()
+        with executor:
+            for events in executor.map(func, *(args + tuple(zip(*tasks)))):  # map()は引数の順に結果を返すので出力の順序は変わらない。
+                yield from events
+    finally:
+        pool.close()
+def listSubtrees(cp, paths):  # 根ノードpathsの子ノードを分割の単位にして返す。
+    configreader = createConfigReader(cp)  # 読み込み専用の関数を取得。
+    tasks = []
+    for path in paths:
+        root = configreader(path)  # 引数のパスで根ノードを取得。
+        base = root.getHierarchicalName()
+        names = root.getElementNames()
+        segments = names if hasattr(root, "getPropertyValues") else [escapeSegment(root.getElementTemplateName(), name) for name in names]  # セットノードの要素名はエスケープする。
+        tasks.extend((path, "{}/{}".format(base, segment), name) for name, segment in zip(names, segments))
+        root.dispose()  # ConfigurationAccessサービスのインスタンスを破棄。
+    return tasks
+def exportSubtree(cp, path, childpath, name):  # 根ノードpathの子ノードname以下の葉の(パス, 値)のリストを返す。childpathは子ノードのパス。
+    root = createConfigReader(cp)(path)  # 引数のパスで根ノードを取得。
+    try:
+        value = root.getByName(name)
+        return list(walkNodes(value, path=childpath)) if isPyUNO(value) else [(childpath, value)]  # 子が葉のときはそのまま返す。
+    finally:
+        root.dispose()  # ConfigurationAccessサービスのインスタンスを破棄。
+def exportSubtreeInPool(pool, path, childpath, name):  # ThreadPoolExecutorで実行する。
+    with pool.connection() as cp:
+        return exportSubtree(cp, path, childpath, name)
+def exportSubtreeInProcess(connects, index, path, childpath, name):  # ProcessPoolExecutorで実行する。接続はプロセスごとに使い回す。
+    if index not in _providers:  # connectsはタスクごとにunpickleした別のオブジェクトなので番号をキーにする。
+        _providers[index] = connects[index]()
+    return exportSubtree(_providers[index], path, childpath, name)
+_providers = {}  # ProcessPoolExecutorのプロセスでの接続。キー: connectsの番号。
+def connectProvider(url):  # UNO URLのofficeに接続してConfigurationProviderを返す。partial(connectProvider, url)をexportConfigurations()に渡す。
+    ctx = resolveUrl(url)  # 接続ごとに別のブリッジになる。
+    return createProvider(ctx, ctx.getServiceManager())
+class ConnectionPool:  # ConfigurationProviderのプール。接続は必要になったときに最大size個まで作る。
+    def __init__(self, connects, size):
+        self._connects = connects  # 接続を作る関数のリスト。順番に使う。
+        self._size = size
+        self._created = 0
+        self._idle = queue.Queue()  # 使っていない接続。
+        self._lock = threading.Lock()
+        self._closed = False
+    def acquire(self):  # 接続を借りる。すべて使用中で最大数に達しているときは返却を待つ。
+        if self._closed:
+            raise RuntimeError("connection pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                index = self._created
+                if index<self._size:
+                    self._created += 1
+            if index<self._size:
+                try:
+                    return self._connects[index%len(self._connects)]()  # 接続はロックの外で作る。
+                except:  # 接続できなかったときは枠を戻す。戻さないとすべての枠を失ったあとのacquire()が返らなくなる。
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            return self._idle.get()
+    def release(self, cp):  # 接続を返す。close()したあとは手放す。
+        with self._lock:
+            if not self._closed:
+                self._idle.put(cp)
+    @contextmanager
+    def connection(self):
+        cp = self.acquire()
+        try:
+            yield cp
+        finally:
+            self.release(cp)
+    def close(self):  # 使っていない接続を手放す。プロキシがなくなるとブリッジは閉じる。使用中の接続は返されたときに手放す。
+        with self._lock:
+            self._closed = True
+            while not self._idle.empty():
+                self._idle.get_nowait()
 class Visit:  # ノードを選別するためのクラス。
     def __init__(self, node):
         self.node = node   
 class NodeVisitor:  # ジェネレーター版Vistorパターン
     def visit(self, node):
+        return list(self.iterVisit(node))  # 結果を取得したリストを返す。
+    def iterVisit(self, node):  # 結果を1つずつ返すジェネレーター。
         stack = [Visit(node)]  # ノードをVisitクラスのインスタンスにする。
-        last_result = []  # 結果を入れるリスト。
         while stack:  # スタックがある間実行。
             try:
                 last = stack[-1]  # スタックの最後の要素を取得。
@@ -116,12 +559,11 @@ class NodeVisitor:  # ジェネレーター版Vistorパターン
                 elif isinstance(last, Visit):  # lastがVisitのインスタンスのとき
                     stack.append(self._visit(stack.pop().node))  # スタックの最後の値を取り出してノードを_visitメソッドに渡した戻り値をスタックに取得。
                 else:
-                    last_result.append(stack.pop())  # lastがジェネレーターでもVisitのインスタンスでもないときはstackから取り出してlast_resultの要素に追加する。
+                    yield stack.pop()  # lastがジェネレーターでもVisitのインスタンスでもないときはstackから取り出して返す。
             except StopIteration:  # ジェネレーターから値が取得できなかったとき
                 stack.pop()  # ジェネレーターを捨てる。
-        return last_result  # 結果を取得したリストを返す。
     def _visit(self, node):  # 各ノードでの処理を振り分ける。
-        name = "PyUNO" if type(node).__name__=="pyuno" else "Values"  # ノードがPyUNOオブジェクトかそうでないかで振り分け。
+        name = "PyUNO" if isPyUNO(node) else "Values"  # ノードがPyUNOオブジェクトかそうでないかで振り分け。
         self.methname = 'visit_{}'.format(name)  # ノードに適用するメソッド名を取得。
         meth = getattr(self, self.methname, None)  # selfの属性にあるメソッドを取得。メソッドが存在しないときはNoneを返す。
         if meth is None:  # メッソドが存在しなかったとき
@@ -131,10 +573,7 @@ class NodeVisitor:  # ジェネレーター版Vistorパターン
         raise RuntimeError('No {} method'.format(self.methname))
 class Evaluator(NodeVisitor):  # ノードに適用するメソッドを持つNodeVisitorのサブクラス。これらのメソッドはジェネレーター。
     def visit_Values(self, node):  # ノードがPyUNOオブジェクト以外の時
-        if isinstance(node, tuple):  # タプルの時
-            yield "\tValue: {0} = {{{1}}}".format(self.path, ", ".join(node))
-        else:  # タプルでない時
-            yield "\tValue: {} = {}".format(self.path, node)
+        yield formatValue(self.path, node)
     def visit_PyUNO(self, node):  # ノードがPyUNOオブジェクトのとき
         if hasattr(node, "getTemplateName") and node.getTemplateName().endswith("Filter"):
             yield "Filter {} ({})".format(node.getName(), node.getHierarchicalName())
@@ -144,6 +583,353 @@ class Evaluator(NodeVisitor):  # ノードに適用するメソッドを持つNo
             yield Visit(node.getByName(childname))  # Evaluatorのメソッドで処理するためにVisitクラスのインスタンスにして返す。
 
             
+def exportMain(ctx, smgr, cp=None):  # 引数のファイルに引数のパス以下の設定のスナップショットを書き出す。--workers=Nのときは子ノードごとにN個のスレッドで並列に読む。
+    args = sys.argv[2:]
+    workers = int(args.pop(0)[len("--workers="):]) if args and args[0].startswith("--workers=") else 1
+    if len(args)<2 or workers<1:
+        print("Usage: configexamples.py export [--workers=N] FILENAME NODEPATH...")
+        return
+    filename, *paths = args
+    if cp is None:
+        cp = createProvider(ctx, smgr)  # ConfigurationProviderの取得。
+    count = exportSnapshot(cp, filename, paths, workers)
+    print("Exported {} values to {}.".format(count, filename))
+def exportSnapshot(cp, filename, paths, workers=1):  # 根ノードpaths以下の葉をexportConfigurations()で読んでスナップショットファイルに書き出し、葉の数を返す。
+    return writeSnapshot(filename, exportConfigurations(lambda: cp, paths, workers))  # スレッドは同じConfigurationProviderを共有する。
+SNAPSHOT_MAGIC = b"CFGSNAP2"
+SNAPSHOT_HEADER = struct.Struct("<8sII")  # マジックナンバー、葉の数、ノードの数。
+SNAPSHOT_ENTRY = struct.Struct("<IIII")  # 葉の索引。パスの位置、パスの長さ、値の位置、値の長さ。位置はファイルの先頭から。
+SNAPSHOT_NODE = struct.Struct("<II20s")  # ノードの索引。パスの位置、パスの長さ、部分木のハッシュ。
+SNAPSHOT_LENGTH = struct.Struct("<I")
+def writeSnapshot(filename, events):  # 葉の(パス, 値)をパスで並べ替えた索引付きのファイルに書き出して、葉の数を返す。ノードごとの部分木のハッシュも書き出す。
+    entries = sorted((path.encode("utf-8"), encodeValue(value)) for path, value in events if not isPyUNO(value))
+    nodes = sorted((path.encode("utf-8"), digest) for path, digest in digestSnapshot(entries))
+    offset = SNAPSHOT_HEADER.size + SNAPSHOT_ENTRY.size*len(entries) + SNAPSHOT_NODE.size*len(nodes)  # 索引の後ろにパスと値を置く。
+    index, data = [], []
+    for path, value in entries:
+        index.append(SNAPSHOT_ENTRY.pack(offset, len(path), offset + len(path), len(value)))
+        data.extend((path, value))
+        offset += len(path) + len(value)
+    for path, digest in nodes:
+        index.append(SNAPSHOT_NODE.pack(offset, len(path), digest))
+        data.append(path)
+        offset += len(path)
+    with open(filename, "wb") as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(entries), len(nodes)))
+        f.write(b"".join(index))
+        f.write(b"".join(data))
+    return len(entries)
+def digestSnapshot(entries):  # 葉の(パスのバイト列, 値のバイト列)からdigestTree()と同じハッシュを計算して、ノードの(パス, ハッシュ)を返す。根は空文字のパスにする。
+    children = {}  # キー: ノードのパス、値: 子の(名前, ハッシュ)のリスト。
+    for path, value in entries:
+        *parents, name = splitPath(path.decode("utf-8"))
+        children.setdefault("/" + "/".join(parents) if parents else "", []).append((name, hashlib.sha1(value).digest()))
+        for i in range(len(parents)):  # 葉のない祖先ノードも作る。
+            children.setdefault("/" + "/".join(parents[:i]) if i else "", [])
+    digests = []
+    for path in sorted(children, key=lambda i: len(splitPath(i)), reverse=True):  # 深いノードから計算して親に加える。
+        digest = hashChildren(children[path])
+        digests.append((path, digest))
+        if path:
+            *parents, name = splitPath(path)
+            children["/" + "/".join(parents) if parents else ""].append((name, digest))
+    return digests
+def hashChildren(children):  # 子の(名前, ハッシュ)から名前順にノードのハッシュを計算する。
+    h = hashlib.sha1()
+    for name, digest in sorted(children):
+        h.update(name.encode("utf-8") + b"\0" + digest)
+    return h.digest()
+def encodeValue(value):  # 葉の値を型の1バイトとバイト列にする。
+    if value is None:
+        return b"N"
+    if isinstance(value, bool):  # boolはintより先に場合分けしないといけない。
+        return b"T" if value else b"F"
+    if isinstance(value, int):
+        return b"i" + struct.pack("<q", value)
+    if isinstance(value, float):
+        return b"d" + struct.pack("<d", value)
+    if isinstance(value, str):
+        return b"s" + value.encode("utf-8")
+    if isinstance(value, bytes):
+        return b"b" + value
+    if isinstance(value, uno.ByteSequence):
+        return b"b" + value.value
+    if isinstance(value, (tuple, list)):  # 要素の長さを前に付けて並べる。
+        items = [encodeValue(i) for i in value]
+        return b"t" + b"".join(SNAPSHOT_LENGTH.pack(len(i)) + i for i in items)
+    raise TypeError("Cannot write {} to a snapshot.".format(type(value).__name__))
+def decodeValue(data):  # encodeValue()の逆。
+    tag, body = data[:1], data[1:]
+    if tag==b"N":
+        return None
+    if tag in (b"T", b"F"):
+        return tag==b"T"
+    if tag==b"i":
+        return struct.unpack("<q", body)[0]
+    if tag==b"d":
+        return struct.unpack("<d", body)[0]
+    if tag==b"s":
+        return body.decode("utf-8")
+    if tag==b"b":
+        return bytes(body)
+    items, offset = [], 0
+    while offset<len(body):
+        length, = SNAPSHOT_LENGTH.unpack_from(body, offset)
+        offset += SNAPSHOT_LENGTH.size
+        items.append(decodeValue(body[offset:offset + length]))
+        offset += length
+    return tuple(items)
+class SnapshotFile:  # writeSnapshot()で書き出したファイルをmmapで開いて索引を二分探索する。officeは不要。
+    def __init__(self, filename):
+        self._file = open(filename, "rb")
+        self._mmap = None
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size<SNAPSHOT_HEADER.size:  # 空のファイルはmmapできない。
+                raise ValueError("{} is not a configuration snapshot.".format(filename))
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self._count, self._nodecount = SNAPSHOT_HEADER.unpack_from(self._mmap, 0)
+            self._nodes = SNAPSHOT_HEADER.size + SNAPSHOT_ENTRY.size*self._count  # ノードの索引の位置。
+            if magic!=SNAPSHOT_MAGIC or size<self._nodes + SNAPSHOT_NODE.size*self._nodecount:  # 索引が途中で切れているときも読まない。
+                raise ValueError("{} is not a configuration snapshot.".format(filename))
+        except:
+            self.close()
+            raise
+    def __call__(self, path):  # createConfigReader()の戻り値と同じように根ノードを返す。
+        return SnapshotNode(self, path.rstrip("/"))
+    def _entry(self, i):
+        return SNAPSHOT_ENTRY.unpack_from(self._mmap, SNAPSHOT_HEADER.size + SNAPSHOT_ENTRY.size*i)
+    def _path(self, i):
+        offset, length, _, _ = self._entry(i)
+        return self._mmap[offset:offset + length]
+    def _bisect(self, key, lo=0, hi=None, getpath=None):  # key以上の最初のパスの番号を返す。getpathを渡すとノードの索引を探す。
+        hi = self._count if hi is None else hi
+        getpath = getpath or self._path
+        while lo<hi:
+            mid = (lo + hi)//2
+            if getpath(mid)<key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+    def _node(self, i):
+        return SNAPSHOT_NODE.unpack_from(self._mmap, self._nodes + SNAPSHOT_NODE.size*i)
+    def _nodePath(self, i):
+        offset, length, _ = self._node(i)
+        return self._mmap[offset:offset + length]
+    def _find(self, path):  # 葉の索引の番号を返す。葉でないときはNone。
+        key = path.encode("utf-8")
+        i = self._bisect(key)
+        return i if i<self._count and self._path(i)==key else None
+    def nodeDigest(self, path):  # 書き出したときに計算したノードの部分木のハッシュを返す。ノードでないときはNone。
+        key = path.encode("utf-8")
+        i = self._bisect(key, hi=self._nodecount, getpath=self._nodePath)
+        if i<self._nodecount and self._nodePath(i)==key:
+            return self._node(i)[2]
+        return None
+    def leafDigest(self, i):  # 葉の値をデコードせずにハッシュを返す。
+        _, _, offset, length = self._entry(i)
+        return hashlib.sha1(self._mmap[offset:offset + length]).digest()
+    def leafValue(self, i):
+        _, _, offset, length = self._entry(i)
+        return decodeValue(self._mmap[offset:offset + length])
+    def get(self, path):  # 絶対パスの値を返す。ノードのときはSnapshotNodeを返す。
+        key = path.encode("utf-8")
+        i = self._bisect(key)
+        if i<self._count and self._path(i)==key:  # 葉のとき
+            return self.leafValue(i)
+        i = self._bisect(key + b"/", i)  # "X-1/a"のように"/"より小さい文字が続く兄弟は"X/"より前にある。
+        if i<self._count and self._path(i).startswith(key + b"/"):  # ノードのとき
+            return SnapshotNode(self, path)
+        raise KeyError(path)  # com.sun.star.container.NoSuchElementExceptionの代わり。
+    def childNames(self, path):  # 絶対パスのノードの子ノード名をバイト順で返す。
+        prefix = path.encode("utf-8") + b"/"
+        names = []
+        i = self._bisect(prefix)
+        while i<self._count:
+            key = self._path(i)
+            if not key.startswith(prefix):
+                break
+            name = splitPath(key[len(prefix):].decode("utf-8"))[0]  # エスケープしたセット要素名は"/"を含みうる。
+            names.append(name)
+            name = name.encode("utf-8")
+            if len(key)==len(prefix) + len(name):  # 葉のときは次のパスへ。"X Y"や"X-1"のような兄弟は"X/"より前にある。
+                i += 1
+            else:  # ノードのときは"/"の次の文字"0"まで飛ばして子ノード以下を読まない。
+                i = self._bisect(prefix + name + b"0", i)
+        return tuple(names)
+    def items(self, path=""):  # 絶対パスのノード以下の葉の(パス, 値)をパス順に返すジェネレーター。
+        prefix = path.encode("utf-8") + b"/" if path else b""
+        for i in range(self._bisect(prefix), self._count):
+            offset, length, valueoffset, valuelength = self._entry(i)
+            key = self._mmap[offset:offset + length]
+            if not key.startswith(prefix):
+                break
+            yield key.decode("utf-8"), decodeValue(self._mmap[valueoffset:valueoffset + valuelength])
+    def __len__(self):
+        return self._count
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+class SnapshotNode:  # SnapshotFileのノード。Proxyと同じメソッドで読み込める。
+    def __init__(self, snapshot, path):
+        self._snapshot = snapshot
+        self._path = path  # 絶対パス。
+    def getNode(self, *args):  # Proxy.getNode()と同じ。
+        if len(args)==1:
+            return self.getHierarchicalPropertyValue(*args)
+        elif len(args)>1:
+            return self.getHierarchicalPropertyValues(args)  # Proxyと同じくタプルで返す。
+    def getHierarchicalPropertyValue(self, name):
+        return self._snapshot.get("{}/{}".format(self._path, name))
+    getPropertyValue = getByName = getByHierarchicalName = getHierarchicalPropertyValue
+    def getHierarchicalPropertyValues(self, names):
+        return tuple(self.getHierarchicalPropertyValue(name) for name in names)
+    getPropertyValues = getHierarchicalPropertyValues
+    def getElementNames(self):  # セット要素名はパスと同じくエスケープしたまま返す。
+        return self._snapshot.childNames(self._path)
+    def hasByName(self, name):
+        return name in self.getElementNames()
+    def getName(self):
+        segments = splitPath(self._path)
+        return segmentName(segments[-1]) if segments else ""
+    def getHierarchicalName(self):
+        return self._path
+    def composeHierarchicalName(self, name):
+        return "{}/{}".format(self._path, name)
+    def dispose(self):  # ConfigurationAccessと同じように呼べるようにしておく。
+        pass
+
+
+def diffMain():  # 2つのスナップショットファイルの違いを出力する。officeは不要。
+    if len(sys.argv)<4:
+        print("Usage: configexamples.py diff FILENAME1 FILENAME2 [NODEPATH]")
+        return
+    with SnapshotFile(sys.argv[2]) as old, SnapshotFile(sys.argv[3]) as new:
+        path = sys.argv[4] if len(sys.argv)>4 else ""
+        for difference in diffTrees(old(path), new(path)):
+            print(difference)
+class Difference(namedtuple("Difference", "kind path old new")):  # kind: "added"、"removed"、"changed"のいずれか。pathは根ノードからのパス。
+    __slots__ = ()  # インスタンス辞書の作成抑制。
+    def __str__(self):
+        if self.kind=="added":
+            return "+ {} = {}".format(self.path, self.new)
+        if self.kind=="removed":
+            return "- {} = {}".format(self.path, self.old)
+        return "~ {}: {} -> {}".format(self.path, self.old, self.new)
+class HashNode:  # 部分木の内容のハッシュを持つノード。ハッシュが同じ部分木は葉を比べずに飛ばせる。
+    __slots__ = ("children", "value", "digest")
+    def __init__(self):
+        self.children = None  # ノードのとき子の名前をキーにしたHashNodeの辞書。
+        self.value = None  # 葉のときの値。
+        self.digest = None
+class SnapshotHashNode:  # SnapshotFileの部分木をHashNodeと同じように読む。ハッシュは書き出したときのものを使うので、ハッシュが同じ部分木の葉はデコードしない。
+    __slots__ = ("_snapshot", "_path", "_index", "_children")
+    def __init__(self, snapshot, path):
+        self._snapshot = snapshot
+        self._path = path  # 絶対パス。
+        self._index = snapshot._find(path)  # 葉のときの索引の番号。
+        self._children = None
+    @property
+    def children(self):  # HashNode.childrenと同じ。必要になってから作る。
+        if self._index is not None:
+            return None
+        if self._children is None:
+            self._children = {name: SnapshotHashNode(self._snapshot, "{}/{}".format(self._path, name)) for name in self._snapshot.childNames(self._path)}
+        return self._children
+    @property
+    def value(self):
+        return None if self._index is None else self._snapshot.leafValue(self._index)
+    @property
+    def digest(self):
+        return self._snapshot.nodeDigest(self._path) if self._index is None else self._snapshot.leafDigest(self._index)
+def buildHashTree(source, base=None):  # 根ノード、SnapshotNode、(パス, 値)のイテラブル、入れ子の辞書からHashNodeの木を作る。baseはパスから除く根ノードのパス。
+    if isinstance(source, SnapshotNode):  # ファイルに書き出したハッシュを使うので葉を読まない。
+        return SnapshotHashNode(source._snapshot, source._path)
+    if isPyUNO(source):  # ConfigurationAccessのとき
+        if base is None:
+            base = source.getHierarchicalName()
+        leaves = walkNodes(source, path=base)  # 1つずつ読んでリストに溜めない。
+    elif isinstance(source, dict):  # JSONで書き出したものなど
+        leaves = flattenDict(source)
+    else:
+        leaves = source
+    prefix = base.rstrip("/") + "/" if base else "/"
+    tree = HashNode()
+    tree.children = {}
+    for path, value in leaves:
+        if path.startswith(prefix):
+            path = path[len(prefix):]
+        node = tree
+        *parents, name = splitPath(path)
+        for parent in parents:
+            child = node.children.get(parent)
+            if child is None or child.children is None:
+                child = node.children[parent] = HashNode()
+                child.children = {}
+            node = child
+        leaf = node.children[name] = HashNode()
+        leaf.value = tuple(value) if isinstance(value, list) else value  # JSONではタプルがリストになるため。
+    digestTree(tree)
+    return tree
+def flattenDict(data, path=""):  # 入れ子の辞書を(パス, 値)にするジェネレーター。
+    for name, value in data.items():
+        childpath = "{}/{}".format(path, name) if path else name
+        if isinstance(value, dict):
+            yield from flattenDict(value, childpath)
+        else:
+            yield childpath, value
+def digestTree(tree):  # 葉から順にハッシュを計算する。
+    stack = [(tree, False)]
+    while stack:
+        node, visited = stack.pop()
+        if node.children is None:  # 葉のとき。writeSnapshot()と同じくencodeValue()のバイト列のハッシュにする。
+            try:
+                data = encodeValue(node.value)
+            except TypeError:  # スナップショットに書けない型
+                data = repr((type(node.value).__name__, node.value)).encode("utf-8")
+            node.digest = hashlib.sha1(data).digest()
+        elif visited:  # 子のハッシュが揃ったとき
+            node.digest = hashChildren((name, child.digest) for name, child in node.children.items())
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children.values())
+def diffTrees(old, new, oldbase=None, newbase=None):  # 2つの木の違いをDifferenceで1つずつ返すジェネレーター。HashNodeの木を渡すと作り直さない。
+    old = old if isinstance(old, (HashNode, SnapshotHashNode)) else buildHashTree(old, oldbase)
+    new = new if isinstance(new, (HashNode, SnapshotHashNode)) else buildHashTree(new, newbase)
+    stack = [("", old, new)]
+    while stack:
+        path, a, b = stack.pop()
+        if a is None:  # 新しい木にだけある部分木のとき
+            yield from iterDifferences("added", path, b)
+            continue
+        if b is None:  # 古い木にだけある部分木のとき
+            yield from iterDifferences("removed", path, a)
+            continue
+        if a.digest==b.digest:  # 同じ部分木は飛ばす。
+            continue
+        if a.children is None and b.children is None:  # どちらも葉のとき
+            yield Difference("changed", path, a.value, b.value)
+            continue
+        if a.children is None or b.children is None:  # 葉とノードが入れ替わったとき
+            yield from iterDifferences("removed", path, a)
+            yield from iterDifferences("added", path, b)
+            continue
+        for name in sorted(set(a.children) | set(b.children), reverse=True):  # スタックから名前順に取り出されるように逆順に積む。
+            stack.append(("{}/{}".format(path, name) if path else name, a.children.get(name), b.children.get(name)))
+def iterDifferences(kind, path, node):  # 片方にしかない部分木の葉をすべてDifferenceにして返す。
+    if node.children is None:
+        yield Difference(kind, path, node.value if kind=="removed" else None, node.value if kind=="added" else None)
+        return
+    for name in sorted(node.children):
+        yield from iterDifferences(kind, "{}/{}".format(path, name) if path else name, node.children[name])
+
+
 def updateGroupExample(cp):  # /org.openoffice.Office.Calc/Grid以下の値を変更する例。
     try:
         print("\n--- starting example: update group data --------------")
@@ -154,25 +940,102 @@ def editGridOptions(cp):
     config = createConfigUpdater(cp)  # 読み書き用の関数を取得。
     path = "/org.openoffice.Office.Calc/Grid"
     model = config(path)  # 引数のパスで根ノードをモデルとして取得。
-    controller = GridOptionsEditor(model)  # モデルを引数にしてコントローラを取得。
+    dispatcher = ChangesDispatcher()  # 通知をまとめてワーカースレッドでビューに配る。
+    controller = GridOptionsEditor(model, dispatcher)  # モデルを引数にしてコントローラを取得。
     controller.changeSomeData(config(path + "/Subdivision"))  # コントローラでモデルを変更する。
     if controller.execute()==GridOptionsEditor.SAVE_SETTINGS:  # さらにモデルを変更する。
         try:
             model.commitChanges()  # モデルの変更を書き込む。
         except Exception as e:
             controller.informUserOfError(e)        
+    dispatcher.close()  # 溜まっている通知を配り終えてから
+    print("GridEditor - Dispatcher {}".format(dispatcher.metrics()))
     model.dispose()  # モデルを破棄する。
 def createConfigUpdater(cp):
     def getRoot(path):  # ConfigurationUpdateAccessサービスのインスタンスを返す。
         node = PropertyValue(Name="nodepath", Value=path)
         return cp.createInstanceWithArguments("com.sun.star.configuration.ConfigurationUpdateAccess", (node,))
     return getRoot
+class ConfigBatch:  # 複数のノードへの変更を溜めて、コンポーネントごとに1回のsetHierarchicalPropertyValues()とcommitChanges()で書き込む。
+    def __init__(self, cp):
+        self._configupdater = createConfigUpdater(cp)  # 読み書き用の関数を取得。
+        self._edits = OrderedDict()  # キー: 葉の絶対パス、値: 新しい値。
+        self._roots = OrderedDict()  # キー: コンポーネントのパス、値: 変更するノードのパスの集合。
+    def set(self, path, leaf, value):  # ノードpath以下の葉leafにvalueを書き込む予定にする。同じ葉は後の値で上書きする。
+        path = "/" + path.strip("/")  # "org.openoffice.Office.Calc/Grid"のように先頭の"/"がなくても同じ根ノードにする。
+        self._roots.setdefault("/" + splitPath(path)[0], set()).add(path)
+        self._edits["{}/{}".format(path, leaf)] = value
+    def update(self, path, values):  # 葉のパスをキーにした辞書valuesをまとめてset()する。
+        for leaf, value in values.items():
+            self.set(path, leaf, value)
+    def discard(self):  # 溜めた変更を捨てる。
+        self._edits.clear()
+        self._roots.clear()
+    def commit(self):  # 溜めた変更を書き込んで、書き込んだ葉の数を返す。どれかの根ノードで失敗したときはすべて元に戻して例外を投げ直す。
+        edits, paths = self._edits, self._roots
+        self._edits, self._roots = OrderedDict(), OrderedDict()
+        roots = []  # (根ノード, 葉のパスのタプル, 新しい値のタプル, 古い値のタプル)のリスト。
+        try:
+            for path in (commonNodePath(i) for i in paths.values()):  # コンポーネントごとに共通の祖先ノードを根ノードにする。
+                root = self._configupdater(path)  # 引数のパスで根ノードを取得。
+                while not hasattr(root, "getHierarchicalPropertyValues"):  # セットノードはXMultiHierarchicalPropertySetをサポートしていないので親のグループノードにする。
+                    root.dispose()
+                    path = "/" + "/".join(splitPath(path)[:-1])
+                    root = self._configupdater(path)
+                try:  # rootsに加えるまではここで破棄する。
+                    prefix = path + "/"
+                    leaves = tuple(leaf[len(prefix):] for leaf in edits if leaf.startswith(prefix))
+                    olds = root.getHierarchicalPropertyValues(leaves)  # 今の値を1回で取得する。
+                    changed = [(leaf, edits[prefix + leaf], old) for leaf, old in zip(leaves, olds) if not isSameValue(edits[prefix + leaf], old)]  # 値が変わらない葉は書き込まない。
+                except:
+                    root.dispose()
+                    raise
+                if changed:
+                    roots.append((root, *zip(*changed)))
+                else:
+                    root.dispose()
+            for root, leaves, news, olds in roots:  # commitChanges()の前にすべて書き込んでおく。
+                root.setHierarchicalPropertyValues(leaves, news)
+            committed = []
+            try:
+                for root, leaves, news, olds in roots:
+                    root.commitChanges()  # コンポーネントごとにXChangesListenerが1回呼び出される。
+                    committed.append((root, leaves, olds))
+            except:
+                for root, leaves, olds in committed:  # 書き込み済の根ノードを元の値に戻す。
+                    try:
+                        root.setHierarchicalPropertyValues(leaves, olds)
+                        root.commitChanges()
+                    except:
+                        traceback.print_exc()
+                raise
+            return sum(len(leaves) for _, leaves, _, _ in roots)
+        finally:
+            for root, *_ in roots:
+                root.dispose()  # commitChanges()していない変更は破棄される。
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, *args):  # 例外がなければ書き込み、例外のときは捨てる。
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+def commonNodePath(paths):  # ノードのパスに共通する祖先ノードのパスを返す。
+    segments = [splitPath(path) for path in paths]
+    common = []
+    for names in zip(*segments):
+        if len(set(names))>1:
+            break
+        common.append(names[0])
+    return "/" + "/".join(common)
+def isSameValue(value, old):  # Trueと1のように型が違うものは別の値とする。
+    return type(value)==type(old) and value==old
 class GridOptionsEditor:  # コントローラ
     CANCELED = 0
     SAVE_SETTINGS = 1
-    def __init__(self, model):
+    def __init__(self, model, dispatcher=None):
         self.model = model  # モデルを取得。
-        self.view = GridOptionsEditorView(model)  # ビューを取得
+        self.view = GridOptionsEditorView(model, dispatcher)  # ビューを取得
     def execute(self):  # 孫ノードの値を変更する例の成否を返す。
         try:
             print("-- GridEditor executing --")
@@ -198,40 +1061,56 @@ class GridOptionsEditor:  # コントローラ
     def changeSomeData(self, root):  # 子ノードの値を変更する例。
         try:          
             itemnames = root.getElementNames()
-            for itemname in itemnames:
-                item = root.getByName(itemname)  # getPropertyValue()メソッドで置換可能。
+            items = root.getPropertyValues(itemnames)  # すべての子ノードの値を1回で取得する。
+            names, values = [], []
+            for itemname, item in zip(itemnames, items):
                 if isinstance(item, bool):  # boolはintより先に場合分けしないといけない。
                     print("Replacing boolean value: {}".format(itemname))
-                    root.replaceByName(itemname, False if item else True)  # setPropertyValue()メソッドで置換可能。
+                    names.append(itemname)
+                    values.append(False if item else True)
                 elif isinstance(item, int):
                     item = 9999-item
                     print("Replacing integer value: {}".format(itemname))
-                    root.replaceByName(itemname, item)  # setPropertyValue()メソッドで置換可能。
+                    names.append(itemname)
+                    values.append(item)
+            root.setPropertyValues(tuple(names), tuple(values))  # 1回でまとめて書き込む。1つずつのときはreplaceByName()メソッドを使う。
             root.commitChanges()  # この実行後にXChangesListenerが呼び出される。
             root.dispose()
         except:
             print("Could not change some data in a different view. An exception occurred:")
             traceback.print_exc()     
 class GridOptionsEditorView:  # ビュー
-    def __init__(self, model):
+    def __init__(self, model, dispatcher=None):
         self.model = model  # モデルを取得。
-        self.createChangesListener()  # モデルにリスナーを付ける。
+        self.options = None  # 最後に表示したGridOptions。
+        self.createChangesListener(dispatcher)  # モデルにリスナーを付ける。
         self.updateView()  # ビューを更新。    
     def updateView(self):
         if self.model is not None:
-            print("Grid options editor: data={}".format(self.readModel()))
+            self.options = self.readModel()
+            print("Grid options editor: data={}".format(self.options))
         else:
             print("Grid options editor: no model set")
     def readModel(self):  # モデルの情報をnamedtupleに入れて返す。
         try:
-            options = "Option/VisibleGrid", "Resolution/XAxis/Metric", "Resolution/YAxis/Metric", "Subdivision/XAxis", "Subdivision/YAxis"
-            values = self.model.getHierarchicalPropertyValues(options)
+            values = self.model.getHierarchicalPropertyValues(tuple(GRID_OPTIONS))
             return  GridOptions(*values)
         except Exception as e:
             GridOptionsEditor.informUserOfError(e)
             return None 
-    def createChangesListener(self):  # リスナーをモデルに付ける。
-        self.model.addChangesListener(ChangesListener(self))
+    def createChangesListener(self, dispatcher=None):  # リスナーをモデルに付ける。dispatcherがあるときは変更された値を受け取ってモデルを読み直さない。
+        if dispatcher is None:
+            self.model.addChangesListener(ChangesListener(self))
+        else:
+            dispatcher.subscribe(self.applyChanges)
+            self.model.addChangesListener(dispatcher)
+    def applyChanges(self, delta):  # ChangesDispatcherから呼ばれる。変更された値だけを置き換える。
+        fields = {GRID_OPTIONS[path]: value for path, value in delta.changes.items() if path in GRID_OPTIONS}
+        if self.options is None or len(fields)<len(delta.changes):  # GridOptionsにない値が変わったときだけ読み直す。
+            self.updateView()
+        else:
+            self.options = self.options._replace(**fields)
+            print("Grid options editor: {} change(s) from {} event(s): data={}".format(len(delta.changes), delta.events, self.options))
 class ChangesListener(unohelper.Base, XChangesListener):  # モデルに付けるリスナー。      
     def __init__(self, cast):
         self.cast = cast                   
@@ -240,6 +1119,81 @@ class ChangesListener(unohelper.Base, XChangesListener):  # モデルに付け
         self.cast.updateView()
     def disposing(self, source):  # パブリシャでdispose()したあとに呼ばれる。呼ばれるときにパブリシャは消滅済。
         print("GridEditor - Listener received disposed event: releasing model")
+ChangesDelta = namedtuple("ChangesDelta", "changes events")  # changes: 相対パスをキーにした最新の値の辞書、events: まとめた通知の数。
+DispatcherMetrics = namedtuple("DispatcherMetrics", "received changes superseded delivered")  # 受け取った通知の数、変更の数、上書きで捨てた値の数、配ったChangesDeltaの数。
+class ChangesDispatcher(unohelper.Base, XChangesListener):  # 通知をwindow秒の間パスごとにまとめて、ワーカースレッドかasyncioのイベントループで購読者に配るリスナー。1つの根ノードに付ける。
+    def __init__(self, window=0.05, loop=None):
+        self.window = window  # 最初の通知から配るまでの秒数。
+        self._loop = loop  # Noneのときはワーカースレッドで配る。
+        self._subscribers = []  # ChangesDeltaを引数にして呼ばれる関数のリスト。
+        self._pending = OrderedDict()  # キー: 相対パス、値: 最新の値。
+        self._events = 0  # _pendingにまとめた通知の数。
+        self._scheduled = False  # 配る予定があるときTrue。
+        self._closed = False
+        self._condition = threading.Condition()
+        self.received = self.changes = self.superseded = self.delivered = 0
+        self._thread = None
+        if loop is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+        return callback
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+    def changesOccurred(self, event):  # ブリッジのスレッドから呼ばれる。溜めるだけですぐに戻る。
+        with self._condition:
+            self.received += 1
+            self._events += 1
+            for change in event.Changes:
+                self.changes += 1
+                if change.Accessor in self._pending:  # 前の値は配らない。
+                    self.superseded += 1
+                self._pending[change.Accessor] = change.Element
+            if not self._scheduled:  # 窓の最初の通知のとき
+                self._scheduled = True
+                if self._loop is None:
+                    self._condition.notify()
+                else:
+                    self._loop.call_soon_threadsafe(self._loop.call_later, self.window, self.flush)
+    def disposing(self, source):  # パブリシャでdispose()したあとに呼ばれる。
+        pass
+    def _run(self):  # ワーカースレッド。
+        while True:
+            with self._condition:
+                while not self._scheduled and not self._closed:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.window
+                while not self._closed and time.monotonic()<deadline:  # 窓の間の通知をまとめる。
+                    self._condition.wait(deadline - time.monotonic())
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+    def flush(self):  # 溜まっている変更を呼び出したスレッドで配る。
+        with self._condition:
+            if not self._pending:
+                self._scheduled = False
+                return
+            delta = ChangesDelta(types.MappingProxyType(self._pending), self._events)  # 購読者が変更できないようにする。
+            self._pending, self._events, self._scheduled = OrderedDict(), 0, False
+            self.delivered += 1
+        for callback in list(self._subscribers):
+            try:
+                callback(delta)
+            except:
+                traceback.print_exc()
+    def metrics(self):
+        with self._condition:
+            return DispatcherMetrics(self.received, self.changes, self.superseded, self.delivered)
+    def close(self):  # 溜まっている変更を配ってワーカースレッドを終える。
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        else:
+            self._loop.call_soon_threadsafe(self.flush)
 
 
 def resetGroupExample(cp):  # デフォルト値に戻す例。UNOIDL未実装のため動かない。
@@ -291,6 +1245,86 @@ def connectOffice(func):
         else:
             print("\nThe Office is still running. Someone else prevents termination.")  # 未保存のドキュメントがあってキャンセルボタンが押された時。
     return wrapper
+# funcの前後でOfficeを起動・終了せずに起動済のOfficeに接続したままにする処理
+def connectSession(session):  # OfficeSessionを受け取ってデコレーターを返す。funcにはセッションのConfigurationProviderも渡す。
+    def decorator(func):
+        @wraps(func)
+        def wrapper():
+            try:
+                cp = session.getProvider()  # 切れていたら再接続する。
+            except Exception:
+                print("Could not establish a connection with {}.".format(session.url))
+                sys.exit()
+            ctx = session.getContext()
+            try:
+                func(ctx, ctx.getServiceManager(), cp)  # 引数の関数の実行。
+            except:
+                traceback.print_exc()
+        return wrapper
+    return decorator
+def resolveUrl(url):  # UNO URLのofficeに接続してコンポーネントコンテクストを返す。
+    localctx = uno.getComponentContext()
+    resolver = localctx.getServiceManager().createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", localctx)
+    return resolver.resolve(url)
+class OfficeSession:  # soffice --accept="socket,host=localhost,port=2002;urp;"などで起動済のofficeに接続し続ける。
+    def __init__(self, url="uno:socket,host=localhost,port=2002;urp;StarOffice.ComponentContext", resolve=resolveUrl, retries=5, backoff=0.5, maxbackoff=8, interval=1.0):
+        self.url = url  # パイプのときはuno:pipe,name=...;urp;StarOffice.ComponentContext
+        self._resolve = resolve  # UNO URLを受け取ってコンポーネントコンテクストを返す関数。
+        self.retries = retries  # 接続を試みる回数。
+        self.backoff = backoff  # 最初の再試行までの秒数。再試行ごとに倍にする。
+        self.maxbackoff = maxbackoff
+        self.interval = interval  # この秒数以内に確認済のときは接続を確認しない。
+        self._ctx = None
+        self._provider = None  # createProvider()の戻り値のキャッシュ。
+        self._checked = 0  # 最後に接続を確認した時刻。
+        self._lock = threading.RLock()
+        self.connects = 0  # 接続した回数。
+    def getContext(self):  # 接続を確認してコンポーネントコンテクストを返す。切れているときは再接続する。
+        with self._lock:
+            if self._ctx is None or not self.isAlive():
+                self._connect()
+            return self._ctx
+    def getProvider(self):  # 再接続するまで同じConfigurationProviderを返す。
+        with self._lock:
+            ctx = self.getContext()
+            if self._provider is None:
+                self._provider = createProvider(ctx, ctx.getServiceManager())
+            return self._provider
+    def isAlive(self):  # サービスマネジャーを取得できれば接続は生きている。
+        now = time.monotonic()
+        if now - self._checked<self.interval:
+            return True
+        try:
+            alive = self._ctx.getServiceManager() is not None
+        except Exception:  # com.sun.star.lang.DisposedExceptionなど。
+            alive = False
+        self._checked = now if alive else 0
+        return alive
+    def _connect(self):  # backoffしながら接続を試みる。
+        self._ctx = self._provider = None
+        for attempt in range(self.retries):
+            try:
+                self._ctx = self._resolve(self.url)
+                break
+            except Exception:  # com.sun.star.connection.NoConnectExceptionなど。
+                if attempt==self.retries - 1:
+                    raise
+                time.sleep(min(self.backoff*2**attempt, self.maxbackoff))
+        self._checked = time.monotonic()
+        self.connects += 1
+    def run(self, func):  # funcにコンポーネントコンテクストとサービスマネジャーを渡して実行する。
+        ctx = self.getContext()
+        return func(ctx, ctx.getServiceManager())
+    def close(self):  # 接続を手放す。officeは終了しない。
+        with self._lock:
+            self._ctx = self._provider = None
 if __name__ == "__main__":
-    main = connectOffice(main)
+    url = sys.argv.pop(1)[len("--url="):] if sys.argv[1:2] and sys.argv[1].startswith("--url=") else None  # configexamples.py --url=UNO URL ... のときは起動済のofficeに接続する。
+    connect = connectOffice if url is None else connectSession(OfficeSession(url))
+    if sys.argv[1:2]==["diff"]:  # configexamples.py diff ファイル名1 ファイル名2 [パス]
+        main = diffMain
+    elif sys.argv[1:2]==["export"]:  # configexamples.py export [--workers=N] ファイル名 パス...
+        main = connect(exportMain)
+    else:
+        main = connect(main)
     main()
\ No newline at end of file
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+# configexamples.pyの動作のテスト。configbenchmarks.pyと同じ偽ブリッジを使うのでofficeは不要。pytestで実行する。
+import os
+import sys
+import gc
+import threading
+from functools import partial
+from types import SimpleNamespace
+import pytest
+from configbenchmarks import FakeProvider, StubOffice, CountingListener, createGridTree, createFilterTree, createWideTree, connectCounted, _connected, FILTER_TEMPLATE
+from configexamples import Proxy, createSnapshotReader, createConfigReader, createConfigUpdater, ConfigCache, Evaluator, walkNodes, formatValue, exportConfigurations, exportSnapshot, SnapshotFile, writeSnapshot, ConfigBatch, ChangesDispatcher, OfficeSession, connectSession, readGridSnapshot, readGridConfiguration, printRegisteredFilters, editGridOptions, buildHashTree, diffTrees, diffMain, flattenDict, RoundTripCounter, BridgeTracer, ConnectionPool, main, escapeSegment
+
+
+GRID = "/org.openoffice.Office.Calc/Grid"
+FILTERS = "/org.openoffice.TypeDetection.Filter/Filters"
+TEMPLATE_NAME = "MS Excel 97 Vorlage/Template"  # "/"を含むセット要素名。
+TEMPLATE_PATH = "{}/{}".format(FILTERS, escapeSegment(FILTER_TEMPLATE, TEMPLATE_NAME))  # configmgrと同じくエスケープしたパス。
+
+
+def testReadGridSnapshot():  # 1回の呼び出しでreadGridConfiguration()と同じ値を取得する。
+    cp = FakeProvider(createGridTree(), 0)
+    counter = RoundTripCounter()
+    assert readGridSnapshot(counter.wrap(cp))==readGridConfiguration(cp)
+    assert counter.count==3, counter.methods  # createInstanceWithArguments()、getHierarchicalPropertyValues()、dispose()。
+def testSnapshotGlobOverSet():  # セットノードの要素名はエスケープして展開し、要素ごとに1回呼び出す。
+    cp = FakeProvider(createFilterTree(3), 0)
+    counter = RoundTripCounter()
+    snapshot = createSnapshotReader(counter.wrap(cp))(FILTERS, "*/UIName")
+    assert snapshot.paths[-1]=="{}/UIName".format(escapeSegment(FILTER_TEMPLATE, TEMPLATE_NAME))
+    assert tuple(snapshot)==("Filter 0", "Filter 1", "Filter 2", "Filter 3")
+    assert counter.methods["getHierarchicalPropertyValues"]==4
+    snapshot = createSnapshotReader(cp)(FILTERS, snapshot.paths[-1:])  # エスケープした名前の"["はパターンにしない。
+    assert tuple(snapshot)==("Filter 3",)
+
+def testConfigCacheInvalidation():  # 別のアクセスから変更した葉だけを読み直す。
+    cp = FakeProvider(createGridTree(), 0)
+    with ConfigCache(cp, maxsize=16) as cache:
+        assert cache.get(GRID, "Subdivision/XAxis")==1
+        calls = cp.bridge.calls
+        assert cache.get(GRID, "Subdivision/XAxis")==1 and cp.bridge.calls==calls  # キャッシュから返す。
+        updater = createConfigUpdater(cp)(GRID + "/Subdivision")
+        updater.setPropertyValue("XAxis", 4)
+        updater.commitChanges()
+        updater.dispose()
+        assert cache.get(GRID, "Subdivision/XAxis")==4
+
+def testWalkerEscapesSetElements():  # EvaluatorとwalkNodes()は同じパスと値を返す。
+    cp = FakeProvider(createFilterTree(5), 0)
+    values = [line for line in Evaluator().visit(createConfigReader(cp)(FILTERS)) if line.startswith("\tValue")]
+    assert values==[formatValue(*i) for i in walkNodes(createConfigReader(cp)(FILTERS))]
+    assert "\tValue: {}/UIName = Filter 5".format(TEMPLATE_PATH) in values
+def testPrintRegisteredFilters(capsys):
+    printRegisteredFilters(FakeProvider(createFilterTree(5), 0))
+    assert "Filter {} ({})".format(TEMPLATE_NAME, TEMPLATE_PATH) in capsys.readouterr().out.splitlines()
+def testWalkerPrune():  # エスケープしたパスで枝刈りできる。
+    cp = FakeProvider(createFilterTree(5), 0)
+    paths = [path for path, _ in walkNodes(createConfigReader(cp)(FILTERS), prune=[TEMPLATE_PATH])]
+    assert paths and not any(path.startswith(TEMPLATE_PATH) for path in paths)
+
+@pytest.mark.parametrize("processes, workers", ((False, 1), (False, 4), (True, 2)))
+def testExportConfigurations(tmpdir, processes, workers):  # 接続数によらず同じ順序で書き出し、プールを閉じると接続は残らない。
+    tree = createFilterTree(10)
+    tree.update(createWideTree(5, 4))
+    paths = FILTERS, "/org.openoffice.Bench/Root"
+    logfile = str(tmpdir.join("connects.log"))
+    events = list(exportConfigurations(partial(connectCounted, logfile, tree, 0), paths, workers, processes))
+    expected = list(walkNodes(createConfigReader(FakeProvider(tree, 0))(FILTERS))) + list(walkNodes(createConfigReader(FakeProvider(tree, 0))(paths[1])))
+    assert events==expected
+    with open(logfile) as f:
+        assert len(f.readlines())<=workers + processes  # プロセスのときは一覧を取得する接続が加わる。
+    gc.collect()
+    assert not _connected, len(_connected)
+def testConnectionPoolFailedConnect():  # 接続できなかったときは枠を戻す。
+    attempts = []
+    def connect():
+        attempts.append(None)
+        if len(attempts)==1:
+            raise ConnectionError("refused")
+        return object()
+    pool = ConnectionPool([connect], 1)
+    with pytest.raises(ConnectionError):
+        pool.acquire()
+    cp = pool.acquire()  # 枠がないと返却を待ち続ける。
+    pool.release(cp)
+    pool.close()
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+def testExportSnapshot(tmpdir):  # 書き出したファイルは生きたブリッジと同じ木になる。
+    cp = FakeProvider(createFilterTree(20), 0)
+    filename = str(tmpdir.join("filters.snapshot"))
+    assert exportSnapshot(cp, filename, [FILTERS], 4)==len(list(walkNodes(createConfigReader(cp)(FILTERS))))
+    with SnapshotFile(filename) as snapshot:
+        assert list(walkNodes(snapshot(FILTERS)))==sorted(walkNodes(createConfigReader(cp)(FILTERS)))  # スナップショットはパス順。
+        assert not list(diffTrees(snapshot(FILTERS), createConfigReader(cp)(FILTERS)))
+        expected = Proxy(createConfigReader(cp)(TEMPLATE_PATH)).getNode("UIName", "Flags")
+        assert snapshot(TEMPLATE_PATH).getNode("UIName", "Flags")==expected and type(expected) is tuple
+
+def testSnapshotFileSiblings(tmpdir):  # "/"より小さい文字が続く兄弟を飛ばさない。
+    filename = str(tmpdir.join("siblings.snapshot"))
+    writeSnapshot(filename, [("/C/N/X", 1), ("/C/N/X Y", 2), ("/C/N/X-1/a", 3), ("/C/N/X.2", 4), ("/C/N/Y(1)/a", 5), ("/C/N/Y/b", 6), ("/C/N/Z", 7), ("/C/M/X-1/a", 8), ("/C/M/X/a", 9)])
+    with SnapshotFile(filename) as snapshot:
+        assert snapshot.childNames("/C/N")==("X", "X Y", "X-1", "X.2", "Y(1)", "Y", "Z")
+        assert snapshot.get("/C/N/Y").getElementNames()==("b",) and snapshot("/C/N").getNode("Y").getNode("b")==6
+        assert snapshot.get("/C/M/X").getNode("a")==9  # X-1/aの後ろにあるノードも見つかる。
+@pytest.mark.parametrize("data", (b"", b"CFGSNAP2", b"NOTASNAP" + bytes(8), b"CFGSNAP2" + bytes([1, 0, 0, 0, 0, 0, 0, 0])))
+def testSnapshotFileInvalid(tmpdir, data):  # 空、短い、マジックナンバーが違う、索引が切れているファイル。
+    filename = str(tmpdir.join("invalid.snapshot"))
+    with open(filename, "wb") as f:
+        f.write(data)
+    with pytest.raises(ValueError):
+        SnapshotFile(filename)
+
+def testConfigBatchRollback():  # 2つ目のコンポーネントで失敗したときは1つ目も元に戻す。
+    cp = FakeProvider(createGridTree(), 0)
+    cp.tree["org.openoffice.Office.Writer"] = {"Grid": {"Option": {"VisibleGrid": True}}}
+    cp.fail.add("/org.openoffice.Office.Writer/Grid/Option")
+    with pytest.raises(RuntimeError):
+        with ConfigBatch(cp) as batch:
+            batch.set(GRID + "/Option", "VisibleGrid", False)
+            batch.set(GRID + "/Subdivision", "XAxis", 7)
+            batch.set("/org.openoffice.Office.Writer/Grid/Option", "VisibleGrid", False)
+    assert createConfigReader(cp)(GRID).getHierarchicalPropertyValues(("Option/VisibleGrid", "Subdivision/XAxis"))==(True, 1)
+def testConfigBatchNotifiesOnce():  # コンポーネントごとに1回だけ書き込む。
+    cp = FakeProvider(createGridTree(), 0)
+    listener = CountingListener()
+    createConfigReader(cp)(GRID).addChangesListener(listener)
+    with ConfigBatch(cp) as batch:
+        batch.set(GRID + "/Subdivision", "XAxis", 2)
+        batch.set(GRID + "/Subdivision", "YAxis", 2)
+        batch.set(GRID + "/Option", "SnapToGrid", False)  # 今の値と同じ葉は書き込まない。
+    assert (listener.events, listener.changes)==(1, 2)
+def testConfigBatchRelativePath():  # 先頭の"/"がないパスも書き込む。
+    cp = FakeProvider(createGridTree(), 0)
+    with ConfigBatch(cp) as batch:
+        batch.set(GRID.lstrip("/") + "/Subdivision/", "YAxis", 9)
+    assert cp.tree["org.openoffice.Office.Calc"]["Grid"]["Subdivision"]["YAxis"]==9
+def testConfigBatchSetElements():  # 共通の祖先がセットノードのときは親のグループノードから書き込む。
+    cp = FakeProvider(createFilterTree(3), 0)
+    with ConfigBatch(cp) as batch:
+        batch.set("{}/{}".format(FILTERS, escapeSegment(FILTER_TEMPLATE, "filter0001")), "UIName", "one")
+        batch.set(TEMPLATE_PATH, "UIName", "template")
+    filters = cp.tree["org.openoffice.TypeDetection.Filter"]["Filters"]
+    assert (filters["filter0001"]["UIName"], filters[TEMPLATE_NAME]["UIName"])==("one", "template")
+def testConfigBatchDisposesOnError():  # 読み込みで失敗した根ノードも破棄する。
+    cp = FakeProvider(createGridTree(), 0)
+    counter = RoundTripCounter()
+    with pytest.raises(KeyError):
+        with ConfigBatch(counter.wrap(cp)) as batch:
+            batch.set(GRID + "/Option", "Nope", 1)
+    assert counter.methods["dispose"]==counter.methods["createInstanceWithArguments"]==1
+
+def testChangesDispatcher():  # 通知をまとめて最後の値を配る。
+    cp = FakeProvider(createGridTree(), 0)
+    model = createConfigReader(cp)(GRID)
+    deltas = []
+    dispatcher = ChangesDispatcher(window=0.02)
+    dispatcher.subscribe(deltas.append)
+    model.addChangesListener(dispatcher)
+    updater = createConfigUpdater(cp)(GRID)
+    for i in range(20):
+        updater.setHierarchicalPropertyValue("Subdivision/XAxis", i)
+        updater.commitChanges()
+    dispatcher.close()
+    assert deltas and deltas[-1].changes["Subdivision/XAxis"]==19
+
+def testConnectSessionReusesProvider():  # コマンドラインからの実行でもセッションのConfigurationProviderを使い回す。
+    office = StubOffice(startup=0, connect=0, latency=0)
+    session = OfficeSession(resolve=office.resolve, backoff=0.01, interval=0)
+    providers = office.providers
+    received = []
+    task = connectSession(session)(lambda ctx, smgr, cp=None: received.append(cp))
+    for i in range(3):
+        task()
+    assert office.providers==providers + 1 and all(cp is session.getProvider() for cp in received)
+def testOfficeSessionReconnects():  # 接続が切れたときは再接続する。
+    office = StubOffice(startup=0, connect=0, latency=0)
+    session = OfficeSession(resolve=office.resolve, backoff=0.01, interval=0)
+    readGridSnapshot(session.getProvider())
+    session._ctx.disposed = True
+    office.alive = False
+    timer = threading.Timer(0.02, setattr, (office, "alive", True))  # 少し後にofficeが戻る。
+    timer.start()
+    assert readGridSnapshot(session.getProvider())==readGridConfiguration(FakeProvider(createGridTree(), 0))
+    timer.join()
+    assert session.connects==2
+
+def testProxyInternsNodes():  # 取得済の子ノードはブリッジを呼び出さずに同じProxyを返す。
+    cp = FakeProvider(createGridTree(), 0)
+    root = Proxy(createConfigReader(cp)(GRID))
+    node = root.getNode("Resolution")
+    calls = cp.bridge.calls
+    assert root.getNode("Resolution") is node and cp.bridge.calls==calls
+    assert node.getNode("XAxis/Metric", "YAxis/Metric")==(1000, 1000)
+
+def changedTrees():  # 数個の葉だけが違う2つの木と、違う葉のパスを返す。
+    old = createWideTree(20, 20)
+    new = createWideTree(20, 20)
+    root = new["org.openoffice.Bench"]["Root"]
+    root["Node0003"]["Leaf0007"] = -1
+    del root["Node0012"]["Leaf0001"]
+    root["Node0019"]["Leaf9999"] = 0
+    a, b = dict(flattenDict(old)), dict(flattenDict(new))
+    return old, new, sorted(path for path in set(a) | set(b) if a.get(path, KeyError)!=b.get(path, KeyError))
+def testDiffTrees():
+    old, new, expected = changedTrees()
+    assert [i.path for i in diffTrees(buildHashTree(old), buildHashTree(new))]==expected
+    oldcp, newcp = FakeProvider(old, 0), FakeProvider(new, 0)  # 生きたブリッジの根ノード同士も比べられる。
+    path = "/org.openoffice.Bench/Root"
+    assert len(list(diffTrees(createConfigReader(oldcp)(path), createConfigReader(newcp)(path))))==len(expected)
+def testDiffSnapshotFiles(tmpdir, monkeypatch, capsys):  # 書き出したときのハッシュで比べてもdiffMain()でも同じ結果になる。
+    old, new, expected = changedTrees()
+    filenames = str(tmpdir.join("old.snapshot")), str(tmpdir.join("new.snapshot"))
+    for filename, tree in zip(filenames, (old, new)):
+        writeSnapshot(filename, (("/" + path, value) for path, value in flattenDict(tree)))
+    with SnapshotFile(filenames[0]) as oldfile, SnapshotFile(filenames[1]) as newfile:
+        differences = list(diffTrees(oldfile(""), newfile("")))
+    assert [i.path for i in differences]==expected
+    monkeypatch.setattr(sys, "argv", ["configexamples.py", "diff", filenames[0], filenames[1], "/org.openoffice.Bench/Root"])
+    diffMain()
+    assert capsys.readouterr().out.splitlines()==[str(i._replace(path=i.path[len("org.openoffice.Bench/Root/"):])) for i in differences]
+
+def testBridgeTracer(capsys):  # 遅いパスを見つけて、偽ブリッジの呼び出しをすべて記録する。
+    tree = createGridTree()
+    tree.update(createFilterTree(3))
+    cp = FakeProvider(tree, 0)
+    slowpath = GRID + "/Resolution"
+    cp.delays[slowpath] = 0.02  # このノードの取得だけを遅くする。
+    tracer = BridgeTracer()
+    traced = tracer.wrap(cp)
+    readGridConfiguration(traced)
+    printRegisteredFilters(traced)
+    editGridOptions(traced)
+    capsys.readouterr()
+    slowest = tracer.top(1, "max")[0]
+    assert slowest.path==slowpath and slowest.max>=0.02, slowest
+    assert len(tracer.records)==cp.bridge.calls
+    paths = {record.path for record in tracer.records if record.method=="getByName"}
+    assert TEMPLATE_PATH in paths and "{}/{}".format(FILTERS, TEMPLATE_NAME) not in paths  # セット要素はエスケープしたパスで記録する。
+def testBridgeTracerDisabled():
+    cp = FakeProvider(createGridTree(), 0)
+    assert BridgeTracer(enabled=False).wrap(cp) is cp
+def testMainWithoutProvider(tmpdir, monkeypatch, capsys):  # ConfigurationProviderが取得できないときはトレースしていても例を実行しない。
+    monkeypatch.setenv("CONFIGEXAMPLES_TRACE", str(tmpdir.join("trace.json")))
+    main(None, SimpleNamespace(createInstanceWithContext=lambda service, ctx: None))
+    assert "No provider available. Cannot access configuration data." in capsys.readouterr().out.splitlines()